@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
@@ -27,6 +28,8 @@ MZRF_CERT_PATH = CERT_DIR / "rosminzdrav.crt"
 # Значения по умолчанию для несекретных параметров проекта
 DEFAULT_LOG_LEVEL = "INFO"
 DEFAULT_ENV = "production"  # "development" | "staging" | "production"
+# Режимы опроса справочников НСИ
+NSI_POLLING_MODES = ("fixed", "adaptive", "rolling")
 
 
 @dataclass(frozen=True)
@@ -67,6 +70,13 @@ class ExternalAPIsConfig:
     fnsi_request_timeout: int
     # Количество повторных попыток при таймаутах/5xx ФНСИ
     fnsi_max_retries: int
+    # Верхняя граница параллельных запросов проверки справочников ФНСИ
+    # (по ней же определяется размер пула HTTP-соединений)
+    fnsi_max_workers: int
+    # Режим опроса справочников НСИ: fixed | adaptive | rolling
+    nsi_polling_mode: str
+    # Предельное число проверок справочников в минуту в режиме rolling
+    fnsi_max_rpm: float
     # добавляйте другие интеграции по мере роста
 
 
@@ -80,6 +90,30 @@ class ProxyConfig:
     password: Optional[str]
 
 
+@dataclass(frozen=True)
+class SchedulerConfig:
+    # Максимум одновременно выполняемых задач планировщика
+    max_workers: int
+    # Таймаут задачи по умолчанию (сек), если задача не задала свой
+    job_timeout: int
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    # Сколько ждать снятия блокировки базы другим потоком (мс)
+    busy_timeout_ms: int
+    # Размер отображения файла базы в память (байт, 0 - отключено)
+    mmap_size: int
+    # Журнал активности: максимальная задержка записи события (мс)
+    activity_flush_ms: int
+    # Журнал активности: записывать сразу, если накопилось столько событий
+    activity_batch_size: int
+    # Журнал активности старше стольких дней переносится в архив (0 - не переносить)
+    activity_retention_days: int
+    # Время ежедневного обслуживания базы "HH:MM" (архив журнала, VACUUM)
+    maintenance_at: str
+
+
 @dataclass(frozen=True)
 class Config:
     app: AppConfig
@@ -87,6 +121,8 @@ class Config:
     paths: PathsConfig
     apis: ExternalAPIsConfig
     proxy: ProxyConfig
+    scheduler: SchedulerConfig
+    database: DatabaseConfig
 
 
 # Кеш конфигурации, чтобы не читать .env многократно
@@ -131,6 +167,22 @@ def get_config() -> Config:
     except ValueError:
         fnsi_max_retries = 3
 
+    _fnsi_workers_str = _read_env("FNSI_MAX_WORKERS", "4")
+    try:
+        fnsi_max_workers = max(1, int(_fnsi_workers_str))
+    except ValueError:
+        fnsi_max_workers = 4
+
+    nsi_polling_mode = _read_env("NSI_POLLING_MODE", "fixed").lower()
+    if nsi_polling_mode not in NSI_POLLING_MODES:
+        nsi_polling_mode = "fixed"
+
+    _fnsi_rpm_str = _read_env("FNSI_MAX_RPM", "6")
+    try:
+        fnsi_max_rpm = max(0.1, float(_fnsi_rpm_str))
+    except ValueError:
+        fnsi_max_rpm = 6.0
+
     # Настройки прокси
     proxy_enabled = _read_env("PROXY_ENABLED", "false").lower() in ("true", "1", "yes")
     proxy_type = _read_env("PROXY_TYPE", "http")
@@ -142,6 +194,56 @@ def get_config() -> Config:
 
     telegram_api_base_url = _read_env("TELEGRAM_API_BASE_URL")
 
+    # Планировщик задач
+    _scheduler_workers_str = _read_env("SCHEDULER_MAX_WORKERS", "3")
+    try:
+        scheduler_max_workers = max(1, int(_scheduler_workers_str))
+    except ValueError:
+        scheduler_max_workers = 3
+
+    _job_timeout_str = _read_env("SCHEDULER_JOB_TIMEOUT", "3600")
+    try:
+        scheduler_job_timeout = max(1, int(_job_timeout_str))
+    except ValueError:
+        scheduler_job_timeout = 3600
+
+    # SQLite
+    _busy_timeout_str = _read_env("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    try:
+        sqlite_busy_timeout_ms = max(0, int(_busy_timeout_str))
+    except ValueError:
+        sqlite_busy_timeout_ms = 5000
+
+    _mmap_size_str = _read_env("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024))
+    try:
+        sqlite_mmap_size = max(0, int(_mmap_size_str))
+    except ValueError:
+        sqlite_mmap_size = 64 * 1024 * 1024
+
+    _activity_flush_str = _read_env("ACTIVITY_FLUSH_MS", "1000")
+    try:
+        activity_flush_ms = max(0, int(_activity_flush_str))
+    except ValueError:
+        activity_flush_ms = 1000
+
+    _activity_batch_str = _read_env("ACTIVITY_BATCH_SIZE", "200")
+    try:
+        activity_batch_size = max(1, int(_activity_batch_str))
+    except ValueError:
+        activity_batch_size = 200
+
+    _retention_str = _read_env("ACTIVITY_RETENTION_DAYS", "180")
+    try:
+        activity_retention_days = max(0, int(_retention_str))
+    except ValueError:
+        activity_retention_days = 180
+
+    maintenance_at = _read_env("DB_MAINTENANCE_AT", "04:30")
+    try:
+        datetime.strptime(maintenance_at, "%H:%M")
+    except ValueError:
+        maintenance_at = "04:30"
+
     app_cfg = AppConfig(
         bot_token=bot_token,
         env=env,
@@ -175,6 +277,9 @@ def get_config() -> Config:
         fnsi_api_key=fnsi_api_key,
         fnsi_request_timeout=fnsi_request_timeout,
         fnsi_max_retries=fnsi_max_retries,
+        fnsi_max_workers=fnsi_max_workers,
+        nsi_polling_mode=nsi_polling_mode,
+        fnsi_max_rpm=fnsi_max_rpm,
     )
 
     proxy_cfg = ProxyConfig(
@@ -186,11 +291,27 @@ def get_config() -> Config:
         password=proxy_pass,
     )
 
+    scheduler_cfg = SchedulerConfig(
+        max_workers=scheduler_max_workers,
+        job_timeout=scheduler_job_timeout,
+    )
+
+    database_cfg = DatabaseConfig(
+        busy_timeout_ms=sqlite_busy_timeout_ms,
+        mmap_size=sqlite_mmap_size,
+        activity_flush_ms=activity_flush_ms,
+        activity_batch_size=activity_batch_size,
+        activity_retention_days=activity_retention_days,
+        maintenance_at=maintenance_at,
+    )
+
     _CONFIG = Config(
         app=app_cfg,
         accounts=accounts_cfg,
         paths=paths_cfg,
         apis=apis_cfg,
         proxy=proxy_cfg,
+        scheduler=scheduler_cfg,
+        database=database_cfg,
     )
     return _CONFIG
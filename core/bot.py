@@ -9,6 +9,8 @@ import telebot.apihelper as apihelper
 
 from core.plugin_manager import PluginManager
 from core.scheduler import TaskScheduler
+from services.activity_log import get_activity_logger
+from utils.database import close_all_connections
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +79,10 @@ class SEMDBotCore:
 
         Thread(target=self.scheduler.start, daemon=True).start()
 
+        # Поток записи журнала активности загружает известных пользователей
+        # до первого сообщения
+        get_activity_logger().start()
+
         # Запускаем бота с защитой от сетевых сбоев.
         # infinity_polling прерывается при необрабатываемых исключениях связи,
         # поэтому перезапускаем его в цикле с нарастающей задержкой.
@@ -118,3 +124,6 @@ class SEMDBotCore:
         self._running = False
         self.plugin_manager.shutdown_all()
         self.scheduler.stop()
+        # Дописываем журнал активности до закрытия соединений с базой
+        get_activity_logger().stop()
+        close_all_connections()
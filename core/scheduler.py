@@ -1,18 +1,127 @@
-import schedule
+import heapq
+import itertools
 import time
-from typing import Dict, List, Any, Optional
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Any, Optional
 import logging
 from datetime import datetime
 
+from core.triggers import CronTrigger, IntervalTrigger, Trigger, monthly_cron, quarterly_cron
+from services.database_service import get_scheduler_state, save_scheduler_state
+
+# Задержка старта задачи после срабатывания расписания, после которой
+# пишем предупреждение (все рабочие потоки были заняты)
+_QUEUE_LAG_WARNING = 5.0
+# Максимальный сон планировщика: периодически сверяемся с системными часами
+# на случай их перевода
+_MAX_SLEEP = 300.0
+
+# Виды записей в куче таймеров
+_FIRE = "fire"
+_TIMEOUT = "timeout"
+
+# Секунд в единице интервала
+_UNIT_SECONDS = {'seconds': 1, 'minutes': 60, 'hours': 3600, 'days': 86400}
+
+# Запущенный планировщик (для статистики задач в /jobs)
+_scheduler: Optional["TaskScheduler"] = None
+
+
+def get_task_scheduler() -> Optional["TaskScheduler"]:
+    """Возвращает запущенный планировщик или None"""
+    return _scheduler
+
+
+@dataclass
+class _Job:
+    """Задача планировщика и её статистика"""
+    task_id: str
+    func: Callable
+    trigger: Trigger
+    timeout: float
+    # Удерживается с постановки в очередь до завершения - запуски не перекрываются
+    lock: threading.Lock
+    next_run: Optional[datetime] = None
+    started_at: Optional[float] = None
+    worker: Optional[threading.Thread] = None
+    run_id: int = 0
+    timed_out: bool = False
+    runs: int = 0
+    skipped: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+    last_duration: Optional[float] = None
+    # Сохраняемое в базе состояние (строка scheduler_state)
+    state: Optional[Dict[str, Any]] = None
+
 
 class TaskScheduler:
+    """
+    Планировщик задач.
+
+    Моменты запуска хранятся в куче (min-heap); поток планировщика спит на
+    условной переменной ровно до ближайшего момента (или до добавления новой
+    задачи). В момент запуска задача ставится в очередь, а выполняют её
+    рабочие потоки пула.
+
+    Результат каждого запуска сохраняется в таблицу scheduler_state. При
+    старте календарные запуски, пропущенные пока бот был остановлен,
+    выполняются один раз (только последний пропущенный).
+    """
+
     def __init__(self, config):
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.running = False
-        self.tasks = {}
-    
-    def add_task(self, func, interval: int, unit: str, at: Optional[str] = None, task_name: Optional[str] = None):
+        self.tasks: Dict[str, _Job] = {}
+        self.max_workers = config.scheduler.max_workers
+        self.default_timeout = config.scheduler.job_timeout
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        # Потоки с зависшими задачами: завершаются после своей задачи
+        self._retired = set()
+        self._lock = threading.Lock()
+        # Куча таймеров: (момент time.time(), порядковый номер, вид, task_id, run_id)
+        self._timers: List[tuple] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        # Состояние задач с прошлых запусков бота
+        self._saved_state = get_scheduler_state()
+
+    @staticmethod
+    def build_trigger(interval: float, unit: str, at: Optional[str] = None,
+                      cron: Optional[str] = None) -> Trigger:
+        """
+        Строит правило расписания по параметрам задачи
+
+        Args:
+            interval: Интервал выполнения (для seconds допускаются доли секунды)
+            unit: Единица времени ('seconds', 'minutes', 'hours', 'days', 'months', 'quarters')
+            at: Время выполнения "HH:MM" для days/months/quarters
+            cron: cron-выражение; если задано, interval/unit/at не используются
+        """
+        if cron:
+            return CronTrigger(cron)
+        if unit == 'months':
+            # 1 числа каждого месяца
+            return CronTrigger(monthly_cron(at or "00:00"))
+        if unit == 'quarters':
+            # 1 числа квартала: 1.01, 1.04, 1.07, 1.10
+            return CronTrigger(quarterly_cron(at or "00:00"))
+        if unit == 'days' and at and interval == 1:
+            hour, minute = at.split(":")
+            return CronTrigger(f"{int(minute)} {int(hour)} * * *")
+        if unit not in _UNIT_SECONDS:
+            raise ValueError(f"Неизвестная единица времени: {unit}")
+        return IntervalTrigger(interval * _UNIT_SECONDS[unit])
+
+    def add_task(self, func, interval: float = 1, unit: str = 'minutes', at: Optional[str] = None,
+                 task_name: Optional[str] = None, timeout: Optional[float] = None,
+                 cron: Optional[str] = None):
         """
         Добавляет задачу в планировщик
 
@@ -22,73 +131,273 @@ class TaskScheduler:
             unit: Единица времени ('minutes', 'seconds', 'hours', 'days', 'months', 'quarters')
             at: Время выполнения в формате "HH:MM" (опционально)
             task_name: Имя задачи для идентификации (опционально)
+            timeout: Таймаут выполнения задачи в секундах (опционально)
+            cron: Расписание в формате cron "м ч д мес дн" (опционально, вместо interval/unit)
         """
         task_id = task_name or func.__name__
 
         try:
-            # Регистрируем в schedule библиотеке
-            if unit == 'minutes':
-                job = schedule.every(interval).minutes.do(func)
-            elif unit == 'seconds':
-                job = schedule.every(interval).seconds.do(func)
-            elif unit == 'hours':
-                job = schedule.every(interval).hours.do(func)
-            elif unit == 'days':
-                job = schedule.every(interval).days.do(func)
-                # Поддержка параметра at для дневного расписания
-                if at:
-                    job.at(at)
-            elif unit == 'months':
-                # Для месячного расписания используем кастомную логику
-                # schedule не поддерживает месячные интервалы, поэтому используем дневной интервал
-                # с проверкой внутри функции
-                job = schedule.every().day.do(func)
-                if at:
-                    job.at(at)
-                self.logger.info(f"Задача {task_id} добавлена: ежемесячно в {at or 'любое время'} (проверка через день)")
-            elif unit == 'quarters':
-                # Для квартального расписания используем кастомную логику
-                # schedule не поддерживает квартальные интервалы, поэтому используем дневной интервал
-                # с проверкой внутри функции
-                job = schedule.every().day.do(func)
-                if at:
-                    job.at(at)
-                self.logger.info(f"Задача {task_id} добавлена: ежеквартально в {at or 'любое время'} (проверка через день)")
-            else:
-                self.logger.error(f"Неизвестная единица времени: {unit}")
+            trigger = self.build_trigger(interval, unit, at, cron)
+        except ValueError as e:
+            self.logger.error(f"Ошибка при добавлении задачи {task_id}: {e}")
+            return
+
+        job = _Job(
+            task_id=task_id,
+            func=func,
+            trigger=trigger,
+            timeout=timeout or self.default_timeout,
+            lock=threading.Lock(),
+            state=dict(self._saved_state.get(task_id) or {'task_id': task_id, 'runs': 0}),
+        )
+        job.state['schedule'] = trigger.describe()
+        with self._cond:
+            self.tasks[task_id] = job
+            self._schedule_next(job, datetime.now())
+            self._cond.notify()
+        job.state['next_run'] = job.next_run.isoformat() if job.next_run else None
+        save_scheduler_state(job.state)
+
+        self.logger.info(
+            f"Задача {task_id} добавлена: {trigger.describe()}, "
+            f"следующий запуск {job.next_run:%Y-%m-%d %H:%M:%S}"
+            if job.next_run else f"Задача {task_id} добавлена: {trigger.describe()}, запусков не будет"
+        )
+
+    def _push_timer(self, when: float, kind: str, task_id: str, run_id: int = 0):
+        heapq.heappush(self._timers, (when, next(self._sequence), kind, task_id, run_id))
+
+    def _schedule_next(self, job: _Job, after: datetime):
+        """Вычисляет и ставит в кучу следующий запуск задачи (под self._cond)"""
+        job.next_run = job.trigger.next_fire(after)
+        if job.next_run is not None:
+            self._push_timer(job.next_run.timestamp(), _FIRE, job.task_id)
+
+    def _enqueue(self, job: _Job, fire_time: float):
+        """Ставит задачу в очередь пула, если её предыдущий запуск завершён"""
+        if not job.lock.acquire(blocking=False):
+            job.skipped += 1
+            self.logger.warning(
+                f"Задача {job.task_id} ещё выполняется или ждёт в очереди, запуск пропущен"
+            )
+            return
+        self._queue.put((job, fire_time, time.time()))
+
+    def _start_worker(self):
+        worker = threading.Thread(
+            target=self._worker_loop,
+            name=f"scheduler-worker-{len(self._workers) + 1}",
+            daemon=True,
+        )
+        self._workers.append(worker)
+        worker.start()
+
+    def _worker_loop(self):
+        """Рабочий поток: выполняет задачи из очереди"""
+        current = threading.current_thread()
+        while True:
+            item = self._queue.get()
+            if item is None:
                 return
+            job, fire_time, enqueued_at = item
+            self._run_job(job, fire_time, enqueued_at)
+            with self._lock:
+                if current in self._retired:
+                    # Вместо этого потока уже запущен другой
+                    self._retired.discard(current)
+                    self._workers.remove(current)
+                    return
 
-            self.tasks[task_id] = func
+    def _run_job(self, job: _Job, fire_time: float, enqueued_at: float):
+        """
+        Выполняет задачу и обновляет её статистику
 
-            # Логирование
-            if unit not in ['months', 'quarters']:
-                log_msg = f"Задача {task_id} добавлена: каждые {interval} {unit}"
-                if at and unit in ['days', 'hours']:
-                    log_msg += f" в {at}"
-                self.logger.info(log_msg)
+        Args:
+            job: задача
+            fire_time: момент запуска по расписанию (time.time())
+            enqueued_at: момент постановки в очередь (time.time())
+        """
+        # Задержка от постановки в очередь до фактического старта
+        lag = max(0.0, time.time() - enqueued_at)
+        job.last_lag = lag
+        job.max_lag = max(job.max_lag, lag)
+        if lag > _QUEUE_LAG_WARNING:
+            self.logger.warning(f"Задача {job.task_id} ждала свободный поток {lag:.1f} с")
 
+        # Запуск отмечается до выполнения: если бот упадёт во время задачи,
+        # при следующем старте она не будет повторена (status = running)
+        job.state.update(
+            last_occurrence=datetime.fromtimestamp(fire_time).isoformat(),
+            last_started=datetime.now().isoformat(),
+            last_status='running',
+            last_error=None,
+            next_run=job.next_run.isoformat() if job.next_run else None,
+        )
+        save_scheduler_state(job.state)
+
+        started_at = time.monotonic()
+        status, error = 'ok', None
+        with self._cond:
+            job.run_id += 1
+            job.started_at = started_at
+            job.worker = threading.current_thread()
+            job.timed_out = False
+            self._push_timer(time.time() + job.timeout, _TIMEOUT, job.task_id, job.run_id)
+            self._cond.notify()
+        try:
+            job.func()
         except Exception as e:
-            self.logger.error(f"Ошибка при добавлении задачи {task_id}: {e}")
-    
+            job.errors += 1
+            status, error = 'error', str(e)
+            self.logger.error(f"Ошибка при выполнении задачи {job.task_id}: {e}", exc_info=True)
+        finally:
+            job.last_duration = time.monotonic() - started_at
+            job.runs += 1
+            job.state.update(
+                last_status=status,
+                last_duration=round(job.last_duration, 3),
+                last_error=error,
+                next_run=job.next_run.isoformat() if job.next_run else None,
+                runs=(job.state.get('runs') or 0) + 1,
+            )
+            if status == 'ok':
+                job.state['last_success'] = job.state['last_occurrence']
+            save_scheduler_state(job.state)
+            if job.timed_out:
+                self.logger.warning(
+                    f"Задача {job.task_id} завершилась после таймаута "
+                    f"за {job.last_duration:.1f} с"
+                )
+            job.started_at = None
+            job.worker = None
+            job.lock.release()
+
+    def _handle_timeout(self, job: _Job, run_id: int):
+        """
+        Задача, превысившая таймаут, перестаёт занимать место в пуле:
+        её поток завершится после задачи, а вместо него запускается новый.
+        Следующий запуск самой задачи не начнётся, пока она не завершится.
+        """
+        worker = job.worker
+        if job.run_id != run_id or job.started_at is None or job.timed_out:
+            return
+        job.timed_out = True
+        job.timeouts += 1
+        self.logger.error(
+            f"Задача {job.task_id} выполняется дольше таймаута {job.timeout:.0f} с, "
+            f"её поток выведен из пула"
+        )
+        with self._lock:
+            if worker is not None and worker not in self._retired:
+                self._retired.add(worker)
+                self._start_worker()
+
+    def _catch_up(self):
+        """
+        Выполняет один раз последний пропущенный запуск каждой задачи.
+
+        Пропущенными считаются моменты по расписанию между последним
+        запуском из scheduler_state и текущим временем. Интервальные задачи
+        строят сетку от момента старта бота, поэтому догоняются только
+        календарные (cron, месячные, квартальные).
+        """
+        now = datetime.now()
+        for job in self.tasks.values():
+            last_occurrence = job.state.get('last_occurrence')
+            if not last_occurrence:
+                # Задача ещё ни разу не запускалась
+                continue
+            if job.state.get('last_status') == 'running':
+                self.logger.warning(
+                    f"Задача {job.task_id}: запуск {last_occurrence} был прерван "
+                    f"остановкой бота и не будет повторён автоматически"
+                )
+
+            missed = None
+            occurrence = job.trigger.next_fire(datetime.fromisoformat(last_occurrence))
+            while occurrence is not None and occurrence <= now:
+                missed = occurrence
+                occurrence = job.trigger.next_fire(occurrence)
+            if missed is None:
+                continue
+
+            self.logger.info(
+                f"Задача {job.task_id}: выполняется пропущенный запуск {missed:%Y-%m-%d %H:%M}"
+            )
+            self._enqueue(job, missed.timestamp())
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Статистика задач: запуски, пропуски, таймауты, задержка очереди"""
+        now = time.monotonic()
+        return [
+            {
+                'task_id': job.task_id,
+                'schedule': job.trigger.describe(),
+                'next_run': job.next_run,
+                'running': job.started_at is not None,
+                'running_for': now - job.started_at if job.started_at is not None else None,
+                'runs': job.runs,
+                'skipped': job.skipped,
+                'timeouts': job.timeouts,
+                'errors': job.errors,
+                'last_lag': job.last_lag,
+                'max_lag': job.max_lag,
+                'last_duration': job.last_duration,
+            }
+            for job in self.tasks.values()
+        ]
+
     def start(self):
         """Запускает планировщик"""
+        global _scheduler
+        _scheduler = self
         self.running = True
-        self.logger.info("TaskScheduler запущен")
-        
-        while self.running:
-            schedule.run_pending()  # Выполняет func() если пришло время
-            time.sleep(1)
-    
+        with self._lock:
+            for _ in range(self.max_workers):
+                self._start_worker()
+        self.logger.info(f"TaskScheduler запущен ({self.max_workers} рабочих потоков)")
+
+        with self._cond:
+            self._catch_up()
+            while self.running:
+                if not self._timers:
+                    self._cond.wait()
+                    continue
+
+                when, _, kind, task_id, run_id = self._timers[0]
+                delay = when - time.time()
+                if delay > 0:
+                    # Спим до ближайшего таймера; add_task/stop будят раньше
+                    self._cond.wait(min(delay, _MAX_SLEEP))
+                    continue
+
+                heapq.heappop(self._timers)
+                job = self.tasks.get(task_id)
+                if job is None:
+                    # Задача удалена
+                    continue
+                if kind == _TIMEOUT:
+                    self._handle_timeout(job, run_id)
+                    continue
+                # Следующий запуск - по сетке расписания после назначенного момента
+                self._schedule_next(job, max(datetime.fromtimestamp(when), datetime.now()))
+                self._enqueue(job, when)
+
     def stop(self):
         """Останавливает планировщик"""
-        self.running = False
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        with self._lock:
+            for _ in self._workers:
+                self._queue.put(None)
         self.logger.info("TaskScheduler остановлен")
-    
+
     def remove_task(self, task_id: str):
         """Удаляет задачу"""
-        if task_id in self.tasks:
-            schedule.clear(task_id)
-            del self.tasks[task_id]
+        with self._cond:
+            # Записи задачи в куче пропускаются при срабатывании
+            self.tasks.pop(task_id, None)
 
     @staticmethod
     def is_first_of_month() -> bool:
@@ -108,4 +417,4 @@ class TaskScheduler:
     def get_current_quarter() -> int:
         """Возвращает текущий квартал (1-4)"""
         now = datetime.now()
-        return (now.month - 1) // 3 + 1
\ No newline at end of file
+        return (now.month - 1) // 3 + 1
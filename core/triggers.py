@@ -0,0 +1,143 @@
+"""
+Правила расписания задач планировщика.
+
+Каждое правило вычисляет следующий момент запуска после заданного:
+- IntervalTrigger - через равные промежутки (допускаются доли секунды);
+- CronTrigger - по календарю в формате cron: "минуты часы дни месяцы дни_недели".
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+# Дни недели в cron: 0 (или 7) - воскресенье, 1 - понедельник
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+# Дальше этого срока следующий запуск не ищем (например, "0 0 31 2 *")
+_CRON_SEARCH_LIMIT = timedelta(days=366 * 5)
+
+
+class Trigger:
+    """Базовое правило расписания"""
+
+    def next_fire(self, after: datetime) -> Optional[datetime]:
+        """Первый момент запуска строго после after (None - запусков больше нет)"""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+
+class IntervalTrigger(Trigger):
+    """Запуск каждые seconds секунд, начиная с anchor + seconds"""
+
+    def __init__(self, seconds: float, anchor: Optional[datetime] = None):
+        if seconds <= 0:
+            raise ValueError(f"Интервал должен быть положительным: {seconds}")
+        self.interval = timedelta(seconds=seconds)
+        self.anchor = anchor or datetime.now()
+
+    def next_fire(self, after: datetime) -> datetime:
+        # Сетка запусков от anchor: опоздания не сдвигают следующие запуски
+        if after < self.anchor:
+            return self.anchor + self.interval
+        periods = (after - self.anchor) // self.interval + 1
+        return self.anchor + self.interval * periods
+
+    def describe(self) -> str:
+        return f"каждые {self.interval.total_seconds():g} с"
+
+
+def _parse_cron_field(value: str, low: int, high: int) -> Set[int]:
+    """Разбирает поле cron: *, списки, диапазоны и шаги (*/5, 1-10/2)"""
+    result: Set[int] = set()
+    for part in value.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step <= 0:
+                raise ValueError(f"Некорректный шаг в поле cron: {value}")
+        if part == "*":
+            start, stop = low, high
+        elif "-" in part:
+            start_str, stop_str = part.split("-", 1)
+            start, stop = int(start_str), int(stop_str)
+        else:
+            start = int(part)
+            stop = high if step > 1 else start
+        if not low <= start <= stop <= high:
+            raise ValueError(f"Значение вне диапазона {low}-{high} в поле cron: {value}")
+        result.update(range(start, stop + 1, step))
+    return result
+
+
+class CronTrigger(Trigger):
+    """
+    Календарное расписание в формате cron: "минуты часы дни месяцы дни_недели".
+
+    Как в cron, если заданы и дни месяца, и дни недели, достаточно совпадения
+    любого из них.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Ожидается 5 полей cron, получено {len(fields)}: {expression}")
+        self.expression = expression
+        parsed = [
+            _parse_cron_field(value, low, high)
+            for value, (_, low, high) in zip(fields, _CRON_FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # cron: 0 и 7 - воскресенье; datetime.weekday(): 6 - воскресенье
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_fire(self, after: datetime) -> Optional[datetime]:
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + _CRON_SEARCH_LIMIT
+        while moment <= limit:
+            if moment.month not in self.months:
+                # Первое число следующего месяца
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(year=moment.year + year, month=month + 1, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+                continue
+            if moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+                continue
+            return moment
+        return None
+
+    def describe(self) -> str:
+        return f"cron '{self.expression}'"
+
+
+def monthly_cron(at: str = "00:00", day: int = 1, months: str = "*") -> str:
+    """cron-выражение для запуска day числа месяцев months в at (HH:MM)"""
+    hour, minute = (int(part) for part in at.split(":"))
+    return f"{minute} {hour} {day} {months} *"
+
+
+def quarterly_cron(at: str = "00:00", day: int = 1) -> str:
+    """cron-выражение для запуска в начале квартала: 1.01, 1.04, 1.07, 1.10"""
+    return monthly_cron(at, day, "1,4,7,10")
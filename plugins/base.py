@@ -74,14 +74,16 @@ class ScheduledPlugin(BasePlugin):
     def get_scheduled_tasks(self) -> List[Dict[str, Any]]:
         """Использует get_schedule_config для создания задачи"""
         config = self.get_schedule_config()
-        
-        return [
-            {
-                'func': self.check_updates,  # Главная функция для выполнения
-                'interval': config['interval'],
-                'unit': config['unit']
-            }
-        ]
+
+        task = {
+            'func': self.check_updates,  # Главная функция для выполнения
+            'interval': config['interval'],
+            'unit': config['unit']
+        }
+        # Необязательный таймаут выполнения задачи (сек)
+        if 'timeout' in config:
+            task['timeout'] = config['timeout']
+        return [task]
     
     @abstractmethod
     def check_updates(self):
@@ -0,0 +1,118 @@
+"""
+Предохранитель (circuit breaker) для запросов к ФНСИ.
+
+После серии подряд неудачных попыток запроса к ФНСИ предохранитель
+размыкается, и оставшиеся справочники цикла не проверяются - вместо того
+чтобы каждый из них ждал таймауты и повторы. Через reset_timeout одна
+пробная проверка решает, замкнуть предохранитель или снова разомкнуть.
+"""
+import logging
+from threading import Condition
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Предохранитель с тремя состояниями.
+
+    closed    - запросы разрешены, считаются неудачи подряд;
+    open      - запросы запрещены до истечения reset_timeout;
+    half_open - выполняется одна пробная проверка, остальные ждут её результата.
+    """
+
+    def __init__(self, failure_threshold: int = 6, reset_timeout: float = 600.0):
+        """
+        Args:
+            failure_threshold: число неудачных попыток подряд для размыкания
+            reset_timeout: через сколько секунд после размыкания пробовать снова
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._cond = Condition()
+
+    @property
+    def state(self) -> str:
+        with self._cond:
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнять очередную проверку.
+
+        В состоянии half_open первая проверка становится пробной, остальные
+        ждут её результата.
+        """
+        with self._cond:
+            while True:
+                if self._state == CLOSED:
+                    return True
+                if self._state == OPEN:
+                    if monotonic() - self._opened_at < self.reset_timeout:
+                        return False
+                    self._state = HALF_OPEN
+                    self._probe_in_flight = False
+                    logger.info("Предохранитель ФНСИ: пробная проверка после паузы")
+                # HALF_OPEN
+                if not self._probe_in_flight:
+                    self._probe_in_flight = True
+                    return True
+                self._cond.wait()
+
+    def on_result(self, latency: float, ok: bool):
+        """
+        Учитывает результат одной HTTP-попытки к ФНСИ.
+
+        Args:
+            latency: длительность попытки, сек (не используется)
+            ok: False для таймаута, ошибки соединения или 5xx
+        """
+        with self._cond:
+            if ok:
+                if self._state != CLOSED:
+                    logger.info("Предохранитель ФНСИ замкнут: ФНСИ снова отвечает")
+                self._state = CLOSED
+                self._failures = 0
+                self._cond.notify_all()
+                return
+
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._trip()
+
+    def release_probe(self):
+        """
+        Завершение проверки без ответа ФНСИ (например, прервана по сроку).
+
+        Если это была пробная проверка, предохранитель снова размыкается,
+        чтобы ожидающие проверки не зависли.
+        """
+        with self._cond:
+            if self._state == HALF_OPEN and self._probe_in_flight:
+                self._trip()
+
+    def _trip(self):
+        logger.warning(
+            f"Предохранитель ФНСИ разомкнут после {self._failures} неудачных попыток подряд, "
+            f"следующая попытка через {self.reset_timeout:.0f} с"
+        )
+        self._state = OPEN
+        self._opened_at = monotonic()
+        self._probe_in_flight = False
+        self._cond.notify_all()
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
@@ -0,0 +1,184 @@
+"""
+Адаптивное ограничение параллельности запросов к ФНСИ (AIMD).
+
+Лимит одновременных проверок растёт на 1 за каждое «окно» успешных быстрых
+ответов (additive increase) и уменьшается вдвое при таймаутах, ошибках
+соединения, 5xx или слишком медленных ответах (multiplicative decrease).
+Так параллельность проверки следует за тем, что ФНСИ выдерживает сейчас.
+"""
+import logging
+import statistics
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Condition
+from time import monotonic
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Во сколько раз уменьшается лимит при признаках перегрузки
+_BACKOFF_RATIO = 0.5
+# Одна перегрузка обычно даёт пачку ошибок от всех запросов «в полёте» -
+# повторно уменьшаем лимит не чаще, чем раз в этот интервал (сек)
+_DECREASE_COOLDOWN = 5.0
+
+
+@dataclass
+class SweepStats:
+    """Статистика одного цикла проверки справочников"""
+
+    requests: int
+    errors: int
+    wall_time: float
+    mean_latency: float
+    p95_latency: float
+    peak_in_flight: int
+    # Среднее число одновременно выполнявшихся проверок (закон Литтла)
+    effective_parallelism: float
+    limit_start: float
+    limit_min: float
+    limit_max: float
+    limit_end: float
+
+    def format(self) -> str:
+        return (
+            f"запросов {self.requests}, ошибок {self.errors}, "
+            f"время {self.wall_time:.1f} с, "
+            f"задержка ср. {self.mean_latency:.2f} с / p95 {self.p95_latency:.2f} с, "
+            f"параллельность эфф. {self.effective_parallelism:.2f} / пик {self.peak_in_flight}, "
+            f"лимит {self.limit_start:.1f} → {self.limit_end:.1f} "
+            f"(мин {self.limit_min:.1f}, макс {self.limit_max:.1f})"
+        )
+
+
+class AIMDLimiter:
+    """
+    Ограничитель параллельности с AIMD-регулировкой лимита.
+
+    Проверки выполняются внутри slot(): вход ждёт, пока число выполняющихся
+    проверок не станет меньше текущего лимита. Результаты отдельных
+    HTTP-попыток передаются в on_result().
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[float] = None,
+        latency_target: float = 15.0,
+    ):
+        """
+        Args:
+            max_limit: верхняя граница параллельности
+            min_limit: нижняя граница параллельности
+            initial_limit: стартовый лимит (по умолчанию min_limit)
+            latency_target: ответ дольше этого (сек) считается признаком перегрузки
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_target = latency_target
+        self._limit = float(
+            min(max(initial_limit or self.min_limit, self.min_limit), self.max_limit)
+        )
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = Condition()
+        self._reset_stats()
+
+    @property
+    def limit(self) -> int:
+        """Текущее допустимое число одновременных проверок"""
+        return int(self._limit)
+
+    def _reset_stats(self):
+        self._sweep_started = monotonic()
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._busy_time = 0.0
+        self._peak_in_flight = self._in_flight
+        self._limit_start = self._limit
+        self._limit_min = self._limit
+        self._limit_max = self._limit
+
+    def start_sweep(self):
+        """Начинает сбор статистики нового цикла (лимит сохраняется между циклами)"""
+        with self._cond:
+            self._reset_stats()
+
+    def sweep_stats(self) -> SweepStats:
+        """Статистика с момента start_sweep()"""
+        with self._cond:
+            wall_time = monotonic() - self._sweep_started
+            latencies = sorted(self._latencies)
+            if latencies:
+                mean_latency = statistics.fmean(latencies)
+                p95_latency = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            else:
+                mean_latency = p95_latency = 0.0
+            return SweepStats(
+                requests=len(latencies),
+                errors=self._errors,
+                wall_time=wall_time,
+                mean_latency=mean_latency,
+                p95_latency=p95_latency,
+                peak_in_flight=self._peak_in_flight,
+                effective_parallelism=self._busy_time / wall_time if wall_time else 0.0,
+                limit_start=self._limit_start,
+                limit_min=self._limit_min,
+                limit_max=self._limit_max,
+                limit_end=self._limit,
+            )
+
+    @contextmanager
+    def slot(self):
+        """Занимает место для одной проверки, ожидая, если лимит исчерпан"""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        started = monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._busy_time += monotonic() - started
+                self._cond.notify_all()
+
+    def on_result(self, latency: float, ok: bool):
+        """
+        Учитывает результат одной HTTP-попытки.
+
+        Args:
+            latency: длительность попытки, сек
+            ok: False для таймаута, ошибки соединения или 5xx
+        """
+        with self._cond:
+            self._latencies.append(latency)
+            if not ok:
+                self._errors += 1
+
+            previous = self.limit
+            if ok and latency <= self.latency_target:
+                # +1 к лимиту за каждые ~limit успешных ответов
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            else:
+                now = monotonic()
+                if now - self._last_decrease >= _DECREASE_COOLDOWN:
+                    self._limit = max(self.min_limit, self._limit * _BACKOFF_RATIO)
+                    self._last_decrease = now
+                    logger.info(
+                        f"ФНСИ перегружен ({'медленный ответ' if ok else 'ошибка'}, "
+                        f"{latency:.1f} с): лимит параллельности {previous} → {self.limit}"
+                    )
+
+            self._limit_min = min(self._limit_min, self._limit)
+            self._limit_max = max(self._limit_max, self._limit)
+            if self.limit > previous:
+                self._cond.notify_all()
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
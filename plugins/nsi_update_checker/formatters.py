@@ -53,6 +53,26 @@ class UpdateMessageFormatter(ABC):
 
         return False
 
+    def format_changes(self, fnsi_info: dict, changes: dict, nsi_oid: str) -> str:
+        """
+        Формирует сообщение со сводкой изменённых записей новой версии.
+
+        Отправляется после уведомления о версии, когда справочник
+        загружен в зеркало и сравнён с предыдущей версией.
+
+        Args:
+            fnsi_info: информация о справочнике
+            changes: сводка сравнения версий (nsi_diff.get_diff_summary)
+            nsi_oid: OID справочника
+        """
+        name = fnsi_info.get('shortName') or nsi_oid
+        return (
+            f"📊 <b>{name}</b>: изменения версии "
+            f"{changes['from_version']} → {changes['to_version']}\n"
+            f"Записи: ➕ {changes['added']}  ➖ {changes['removed']}  "
+            f"✏️ {changes['changed']}\n"
+        )
+
     def get_hashtags(self, fnsi_info: dict, nsi_oid: str) -> str:
         """
         Генерирует хэштеги для сообщения.
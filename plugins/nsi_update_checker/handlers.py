@@ -1,23 +1,45 @@
 import logging
-import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from functools import partial
+from threading import Lock
+from time import monotonic
+from typing import List, Optional, Tuple
 
 from telebot import apihelper
 from telebot.types import CallbackQuery
 
-from services.fnsi_client import nsi_passport_updater
+from services.database_service import add_nsi_passports, get_latest_nsi_versions
+from services.fnsi_client import (
+    add_request_listener,
+    check_nsi_version,
+    nsi_passport_updater,
+    remove_request_listener,
+)
+from services.nsi_mirror import get_nsi_mirror
 from utils.message_manager import get_message_manager
 
+from .circuit_breaker import CircuitBreaker
+from .concurrency import AIMDLimiter
 from .data import NSI_DICTIONARIES, NSI_LIST
 from .formatters import (
     DefaultUpdateFormatter,
     ImportantUpdateFormatter,
     MinorUpdateFormatter,
 )
+from .polling import AdaptivePollingPolicy, RollingPollingPolicy
+
+# Результаты проверки одного справочника в цикле
+_CHECKED = "checked"
+_SKIPPED_BREAKER = "skipped_breaker"
+_SKIPPED_DEADLINE = "skipped_deadline"
+
+# Через сколько секунд после размыкания предохранителя снова пробовать ФНСИ
+_BREAKER_RESET_TIMEOUT = 600
 
 
 class NSIUpdHandlers:
-    def __init__(self, bot, config):
+    def __init__(self, bot, config, base_interval: Optional[timedelta] = None):
         self.bot = bot
         self.config = config
         self.logger = logging.getLogger(__name__)
@@ -32,6 +54,37 @@ class NSIUpdHandlers:
             "minor": MinorUpdateFormatter(),
         }
 
+        # Параллельность запросов к ФНСИ подбирается по задержкам и ошибкам
+        # ответов; лимит сохраняется между циклами проверки.
+        # Стартуем с прежних 2 потоков, ответ дольше 1/4 таймаута - перегрузка.
+        self.limiter = AIMDLimiter(
+            max_limit=config.apis.fnsi_max_workers,
+            initial_limit=2,
+            latency_target=config.apis.fnsi_request_timeout / 4,
+        )
+        # После двух справочников подряд, исчерпавших все попытки,
+        # остальные справочники цикла не проверяем
+        self.breaker = CircuitBreaker(
+            failure_threshold=2 * config.apis.fnsi_max_retries,
+            reset_timeout=_BREAKER_RESET_TIMEOUT,
+        )
+        # Новый цикл не запускается, пока не завершён предыдущий
+        self._sweep_lock = Lock()
+
+        # В режиме adaptive в цикле проверяются только справочники,
+        # которым подошёл срок по истории их обновлений
+        self.polling = None
+        if config.apis.nsi_polling_mode == "adaptive":
+            self.polling = AdaptivePollingPolicy(base_interval or timedelta(minutes=33))
+
+        # В режиме rolling справочники проверяются по одному по кругу
+        self.rolling = None
+        self._round_results = {_CHECKED: 0, _SKIPPED_BREAKER: 0}
+        if config.apis.nsi_polling_mode == "rolling":
+            self.rolling = RollingPollingPolicy(
+                NSI_LIST, base_interval or timedelta(minutes=33), config.apis.fnsi_max_rpm
+            )
+
     def _get_formatter(self, nsi_oid: str):
         """
         Получает форматер для справочника на основе его стиля.
@@ -53,25 +106,50 @@ class NSIUpdHandlers:
 
         return formatter
 
-    def _check_single_dictionary(self, nsi_oid: str):
+    def _notifications_enabled(self, nsi_oid: str) -> bool:
+        """Проверяет, включены ли уведомления для этого справочника"""
+        if nsi_oid in NSI_DICTIONARIES and not NSI_DICTIONARIES[nsi_oid].get("notify", True):
+            self.logger.debug(
+                f"Уведомления отключены для справочника {nsi_oid}, пропускаем"
+            )
+            return False
+        return True
+
+    def _send(self, nsi_oid: str, message: str, silent: bool):
+        """Отправляет сообщение во все чаты из списка рассылки"""
+        for chat_id in self.config.accounts.updates_mailing_list:
+            try:
+                self.bot.send_message(
+                    chat_id,
+                    message,
+                    parse_mode="html",
+                    disable_web_page_preview=True,
+                    disable_notification=silent,
+                )
+                mode = "без звука" if silent else "со звуком"
+                self.logger.debug(
+                    f"Уведомление об обновлении {nsi_oid} отправлено в чат {chat_id} ({mode})"
+                )
+            except apihelper.ApiTelegramException as e:
+                self.logger.error(
+                    f"Не удалось отправить сообщение в чат {chat_id}: {e}"
+                )
+            except Exception as e:
+                self.logger.error(
+                    f"Непредвиденная ошибка при отправке сообщения в чат {chat_id}: {e}"
+                )
+
+    def _notify(self, nsi_oid: str, fnsi_info: dict):
         """
-        Проверяет обновления для одного справочника и отправляет уведомления.
-        Используется внутри ThreadPoolExecutor для параллельной проверки.
+        Отправляет уведомление о новой версии справочника в список рассылки.
+
+        Сводка изменённых записей отправляется отдельным сообщением, когда
+        новая версия загрузится в зеркало в фоне и будет сравнена с предыдущей.
         """
         try:
-            updated, fnsi_info = nsi_passport_updater(nsi_oid)
-            if not updated or not fnsi_info:
+            if not self._notifications_enabled(nsi_oid):
                 return
 
-            # Проверяем включены ли уведомления для этого справочника
-            if nsi_oid in NSI_DICTIONARIES:
-                should_notify = NSI_DICTIONARIES[nsi_oid].get("notify", True)
-                if not should_notify:
-                    self.logger.debug(
-                        f"Уведомления отключены для справочника {nsi_oid}, пропускаем"
-                    )
-                    return
-
             # Выбираем форматер на основе стиля справочника
             formatter = self._get_formatter(nsi_oid)
 
@@ -81,62 +159,207 @@ class NSIUpdHandlers:
             # Определяем нужно ли отправлять со звуком
             silent = formatter.should_send_silent(nsi_oid)
 
-            # Отправляем во все чаты из списка рассылки
-            for chat_id in self.config.accounts.updates_mailing_list:
-                try:
-                    self.bot.send_message(
-                        chat_id,
-                        message,
-                        parse_mode="html",
-                        disable_web_page_preview=True,
-                        disable_notification=silent,
-                    )
-                    mode = "без звука" if silent else "со звуком"
-                    self.logger.debug(
-                        f"Уведомление об обновлении {nsi_oid} отправлено в чат {chat_id} ({mode})"
-                    )
-                except apihelper.ApiTelegramException as e:
-                    self.logger.error(
-                        f"Не удалось отправить сообщение в чат {chat_id}: {e}"
-                    )
-                except Exception as e:
-                    self.logger.error(
-                        f"Непредвиденная ошибка при отправке сообщения в чат {chat_id}: {e}"
-                    )
+            self._send(nsi_oid, message, silent)
+
+            get_nsi_mirror().ensure(
+                nsi_oid, fnsi_info["version"], partial(self._notify_changes, nsi_oid, fnsi_info)
+            )
+
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка при отправке уведомления для справочника {nsi_oid}: {e}"
+            )
+
+    def _notify_changes(self, nsi_oid: str, fnsi_info: dict, changes: Optional[dict]):
+        """Отправляет сводку изменённых записей новой версии (из потока зеркала)"""
+        if not changes:
+            return
+        try:
+            formatter = self._get_formatter(nsi_oid)
+            message = formatter.format_changes(fnsi_info, changes, nsi_oid)
+            # Сводка - дополнение к уведомлению, всегда без звука
+            self._send(nsi_oid, message, silent=True)
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка при отправке сводки изменений справочника {nsi_oid}: {e}"
+            )
 
+    def _check_single_dictionary(self, nsi_oid: str, deadline: Optional[float] = None):
+        """Проверяет обновления для одного справочника и отправляет уведомления"""
+        try:
+            updated, fnsi_info = nsi_passport_updater(nsi_oid, deadline=deadline)
+            if updated and fnsi_info:
+                self._notify(nsi_oid, fnsi_info)
         except Exception as e:
             self.logger.error(
                 f"Ошибка при проверке обновлений для справочника {nsi_oid}: {e}"
             )
 
-    def check_updates(self):
+    def _check_with_limit(
+        self, nsi_oid: str, deadline: Optional[float], current_version: Optional[str]
+    ) -> Tuple[str, Optional[dict]]:
+        """
+        Проверяет справочник, дождавшись свободного места в лимите параллельности.
+
+        Используется внутри ThreadPoolExecutor для параллельной проверки.
+
+        Returns:
+            (_CHECKED или причина пропуска справочника, информация о новой версии или None)
+        """
+        with self.limiter.slot():
+            if deadline is not None and monotonic() >= deadline:
+                return _SKIPPED_DEADLINE, None
+            if not self.breaker.allow():
+                return _SKIPPED_BREAKER, None
+            try:
+                fnsi_info = check_nsi_version(nsi_oid, current_version, deadline=deadline)
+            finally:
+                self.breaker.release_probe()
+            return _CHECKED, fnsi_info
+
+    def _select_dictionaries(self, now: datetime) -> List[str]:
+        """Справочники для проверки в текущем цикле"""
+        if self.polling is None:
+            return NSI_LIST
+        self.polling.refresh(NSI_LIST, now)
+        return self.polling.select_due(NSI_LIST, now)
+
+    def check_updates(self, deadline_seconds: Optional[float] = None):
         """
         Проверка обновлений НСИ справочников.
 
         Проверяет справочники параллельно в нескольких потоках,
         чтобы уменьшить общее время цикла при нестабильном соединении с ФНСИ.
+        Число одновременных запросов регулирует AIMDLimiter: растёт, пока ФНСИ
+        отвечает быстро и без ошибок, и уменьшается при таймаутах и 5xx.
+
+        Если ФНСИ не отвечает несколько попыток подряд, предохранитель
+        размыкается и оставшиеся справочники цикла пропускаются.
+
+        Args:
+            deadline_seconds: предельная длительность цикла; справочники,
+                до которых не дошла очередь к этому сроку, пропускаются
+        """
+        if not self._sweep_lock.acquire(blocking=False):
+            self.logger.warning(
+                "Предыдущая проверка справочников НСИ ещё выполняется, пропускаем запуск"
+            )
+            return
+
+        try:
+            deadline = monotonic() + deadline_seconds if deadline_seconds else None
+            results = {_CHECKED: 0, _SKIPPED_BREAKER: 0, _SKIPPED_DEADLINE: 0}
+            sweep_started = datetime.now()
+            nsi_oids = self._select_dictionaries(sweep_started)
+            if not nsi_oids:
+                self.logger.debug("Нет справочников НСИ, которым подошёл срок проверки")
+                return
+
+            # Известные версии всех справочников цикла - одним запросом
+            known_versions = get_latest_nsi_versions(nsi_oids)
+            new_versions: List[Tuple[str, dict]] = []
+
+            self.limiter.start_sweep()
+            add_request_listener(self.limiter.on_result)
+            add_request_listener(self.breaker.on_result)
+            try:
+                # Потоков - по верхней границе, фактическую параллельность
+                # ограничивает лимитер
+                max_workers = min(self.limiter.max_limit, len(nsi_oids))
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = {
+                        executor.submit(
+                            self._check_with_limit, nsi_oid, deadline, known_versions.get(nsi_oid)
+                        ): nsi_oid
+                        for nsi_oid in nsi_oids
+                    }
+                    for future in as_completed(futures):
+                        nsi_oid = futures[future]
+                        try:
+                            result, fnsi_info = future.result()
+                            results[result] += 1
+                            if fnsi_info:
+                                new_versions.append((nsi_oid, fnsi_info))
+                            if result == _CHECKED and self.polling is not None:
+                                self.polling.mark_checked(nsi_oid, sweep_started)
+                        except Exception as e:
+                            self.logger.error(
+                                f"Неожиданная ошибка при проверке справочника {nsi_oid}: {e}"
+                            )
+            finally:
+                remove_request_listener(self.limiter.on_result)
+                remove_request_listener(self.breaker.on_result)
+
+            # Новые версии - одной транзакцией; уведомляем только о записанных
+            added = add_nsi_passports([fnsi_info for _, fnsi_info in new_versions])
+            for nsi_oid, fnsi_info in new_versions:
+                if any(fnsi_info is passport for passport in added):
+                    self.logger.info(
+                        f"Успешно обновлен справочник {nsi_oid} до версии {fnsi_info['version']}"
+                    )
+                    self._notify(nsi_oid, fnsi_info)
+            if len(added) < len(new_versions):
+                self.logger.error(
+                    f"Не удалось добавить в базу {len(new_versions) - len(added)} "
+                    f"новых версий справочников"
+                )
+
+            summary = (
+                f"Проверка справочников НСИ завершена: проверено "
+                f"{results[_CHECKED]}/{len(nsi_oids)} (всего {len(NSI_LIST)}); "
+                f"{self.limiter.sweep_stats().format()}"
+            )
+            if results[_SKIPPED_BREAKER] or results[_SKIPPED_DEADLINE]:
+                self.logger.warning(
+                    f"{summary}; пропущено: ФНСИ недоступен - {results[_SKIPPED_BREAKER]}, "
+                    f"истёк срок цикла - {results[_SKIPPED_DEADLINE]}"
+                )
+            else:
+                self.logger.info(summary)
+        finally:
+            self._sweep_lock.release()
+
+    def check_rolling(self):
+        """
+        Шаг непрерывного обхода справочников (режим rolling).
+
+        Вызывается по расписанию с шагом обхода и проверяет по одному
+        справочнику, которым подошла очередь, так что к ФНСИ одновременно
+        идёт не больше одного запроса.
         """
-        # FNSI плохо справляется с большим числом параллельных запросов
-        # с одного IP. 2 потока + небольшая рассылка запусков снижает
-        # вероятность получения таймаутов со стороны сервера.
-        max_workers = min(2, len(NSI_LIST))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {}
-            for nsi_oid in NSI_LIST:
-                futures[
-                    executor.submit(self._check_single_dictionary, nsi_oid)
-                ] = nsi_oid
-                # Небольшая задержка между постановкой задач в очередь,
-                # чтобы не атаковать ФНСИ пачкой одновременных запросов.
-                time.sleep(0.3)
-            for future in as_completed(futures):
-                nsi_oid = futures[future]
-                try:
-                    future.result()
-                except Exception as e:
-                    self.logger.error(
-                        f"Неожиданная ошибка при проверке справочника {nsi_oid}: {e}"
+        if not self._sweep_lock.acquire(blocking=False):
+            self.logger.debug("Предыдущая проверка справочника НСИ ещё выполняется")
+            return
+
+        # Проверка одного справочника не должна надолго задерживать обход
+        check_timeout = max(self.rolling.step, self.config.apis.fnsi_request_timeout)
+        add_request_listener(self.breaker.on_result)
+        try:
+            while True:
+                nsi_oid = self.rolling.next_due()
+                if nsi_oid is None:
+                    break
+                if self.breaker.allow():
+                    try:
+                        self._check_single_dictionary(nsi_oid, monotonic() + check_timeout)
+                    finally:
+                        self.breaker.release_probe()
+                    self._round_results[_CHECKED] += 1
+                else:
+                    self._round_results[_SKIPPED_BREAKER] += 1
+
+                round_duration = self.rolling.round_completed()
+                if round_duration is not None:
+                    self.logger.info(
+                        f"Круг проверки справочников НСИ завершён за "
+                        f"{round_duration / 60:.1f} мин: проверено "
+                        f"{self._round_results[_CHECKED]}/{len(NSI_LIST)}, "
+                        f"пропущено (ФНСИ недоступен) {self._round_results[_SKIPPED_BREAKER]}"
                     )
+                    self._round_results = {_CHECKED: 0, _SKIPPED_BREAKER: 0}
+        finally:
+            remove_request_listener(self.breaker.on_result)
+            self._sweep_lock.release()
 
     def handle_nsi_checker_menu(self, call: CallbackQuery):
         """
@@ -1,5 +1,7 @@
+from datetime import timedelta
 from typing import List, Dict, Any
 from plugins.base import ScheduledPlugin
+from .data import NSI_LIST
 from .handlers import NSIUpdHandlers
 import logging
 
@@ -11,7 +13,9 @@ class Plugin(ScheduledPlugin):
 
     def __init__(self, bot, config):
         super().__init__(bot, config)
-        self.handlers = NSIUpdHandlers(bot, config)
+        self.handlers = NSIUpdHandlers(
+            bot, config, base_interval=timedelta(seconds=self._sweep_period_seconds())
+        )
         self.logger = logging.getLogger(__name__)
 
     def get_name(self) -> str:
@@ -41,23 +45,43 @@ class Plugin(ScheduledPlugin):
             }
         ]
 
-    def get_schedule_config(self) -> dict:
-        """Конфигурация интервала проверки обновлений НСИ
+    def _sweep_period_seconds(self) -> int:
+        """Период проверки всех справочников в секундах
         Development: каждую минуту
         Production: каждые 33 минуты
         """
-        # Конфигурация расписания
         if self.config.app.env == 'development':
-            return {'interval': 1, 'unit': 'minutes'}
+            return 60
         else:
-            return {'interval': 33, 'unit': 'minutes'}
-    
+            return 33 * 60
+
+    def get_schedule_config(self) -> dict:
+        """Конфигурация интервала проверки обновлений НСИ
+        Development: каждую минуту
+        Production: каждые 33 минуты
+        В режиме rolling задача запускается с шагом обхода:
+        период / число справочников
+        Таймаут задачи - период: цикл сам ограничен 80% периода
+        """
+        period = self._sweep_period_seconds()
+        if self.config.apis.nsi_polling_mode == 'rolling':
+            return {
+                'interval': max(1, int(period / len(NSI_LIST))),
+                'unit': 'seconds',
+                'timeout': period,
+            }
+        return {'interval': period // 60, 'unit': 'minutes', 'timeout': period}
+
     def check_updates(self):
         """Проверяет обновления НСИ справочников
         Вызывается по расписанию и уведомляет пользователей об обновлениях
         """
-        # Вызывает handlers.check_updates()
-        self.handlers.check_updates()
+        if self.config.apis.nsi_polling_mode == 'rolling':
+            self.handlers.check_rolling()
+            return
+        # Цикл должен уложиться в интервал расписания (80%),
+        # чтобы запуски не накапливались друг за другом
+        self.handlers.check_updates(deadline_seconds=self._sweep_period_seconds() * 0.8)
 
     def shutdown(self):
         """Shutdown plugin"""
@@ -0,0 +1,219 @@
+"""
+Режимы опроса справочников НСИ.
+
+adaptive: частота проверки каждого справочника оценивается по истории его
+версий (nsi_passport.lastUpdate) и приоритету из NSI_DICTIONARIES: часто
+обновляемые и важные справочники проверяются с базовым интервалом
+расписания, редко обновляемые - реже, но не реже предела для их приоритета.
+
+rolling: справочники проверяются по одному по кругу, равномерно в течение
+периода; token bucket ограничивает число запросов в минуту.
+"""
+import logging
+import statistics
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+
+from services.database_service import get_nsi_update_history
+
+from .data import NSI_DICTIONARIES
+
+logger = logging.getLogger(__name__)
+
+# Сколько проверок приходится на ожидаемый интервал между версиями
+_CHECKS_PER_UPDATE = 50
+# Сколько последних интервалов между версиями учитывать
+_HISTORY_DEPTH = 10
+# Минимум интервалов между версиями для оценки частоты обновлений
+_MIN_GAPS = 2
+# После выхода новой версии часто выходит исправление - какое-то время
+# проверяем справочник с базовым интервалом
+_HOT_WINDOW = timedelta(days=2)
+# Предельный интервал проверки по приоритету справочника (None - базовый
+# интервал расписания, т.е. задержка обнаружения не увеличивается)
+_MAX_INTERVAL_BY_PRIORITY = {
+    1: None,
+    2: timedelta(hours=12),
+    3: timedelta(days=2),
+}
+
+
+class AdaptivePollingPolicy:
+    """
+    Определяет, какие справочники пора проверить в очередном цикле.
+
+    Интервал проверки справочника:
+    base <= ожидаемый интервал между версиями / _CHECKS_PER_UPDATE <= предел приоритета.
+    Без истории (меньше _MIN_GAPS интервалов) используется предел приоритета.
+    """
+
+    def __init__(self, base_interval: timedelta):
+        """
+        Args:
+            base_interval: интервал запуска цикла по расписанию
+        """
+        self.base_interval = base_interval
+        self._intervals: Dict[str, timedelta] = {}
+        self._last_checked: Dict[str, datetime] = {}
+        self._lock = Lock()
+
+    def _max_interval(self, oid: str) -> timedelta:
+        priority = NSI_DICTIONARIES.get(oid, {}).get("priority", 2)
+        limit = _MAX_INTERVAL_BY_PRIORITY.get(priority, _MAX_INTERVAL_BY_PRIORITY[2])
+        return max(limit or self.base_interval, self.base_interval)
+
+    def _estimate_interval(
+        self, oid: str, updates: List[datetime], now: datetime
+    ) -> timedelta:
+        """Интервал проверки справочника по истории его версий"""
+        max_interval = self._max_interval(oid)
+        if updates and now - updates[-1] < _HOT_WINDOW:
+            return self.base_interval
+
+        gaps = [
+            later - earlier
+            for earlier, later in zip(updates, updates[1:])
+            if later > earlier
+        ][-_HISTORY_DEPTH:]
+        if len(gaps) < _MIN_GAPS:
+            return max_interval
+
+        # Медиана устойчива к единичным внеплановым выпускам
+        expected_gap = statistics.median(gaps)
+        return min(max(expected_gap / _CHECKS_PER_UPDATE, self.base_interval), max_interval)
+
+    def refresh(self, oids: Iterable[str], now: Optional[datetime] = None):
+        """Пересчитывает интервалы проверки по истории версий из базы"""
+        now = now or datetime.now()
+        history = get_nsi_update_history()
+        intervals = {
+            oid: self._estimate_interval(oid, history.get(oid, []), now) for oid in oids
+        }
+        with self._lock:
+            self._intervals = intervals
+
+        checks_per_day = sum(timedelta(days=1) / interval for interval in intervals.values())
+        logger.debug(
+            f"Адаптивный опрос НСИ: ~{checks_per_day:.0f} проверок в сутки "
+            f"(при фиксированном интервале "
+            f"{len(intervals) * (timedelta(days=1) / self.base_interval):.0f})"
+        )
+
+    def interval(self, oid: str) -> timedelta:
+        with self._lock:
+            return self._intervals.get(oid, self.base_interval)
+
+    def select_due(self, oids: Iterable[str], now: Optional[datetime] = None) -> List[str]:
+        """
+        Справочники, которые пора проверить.
+
+        Запас в половину базового интервала не даёт проверке «съехать»
+        на следующий цикл из-за небольшого дрейфа времени запуска.
+        """
+        now = now or datetime.now()
+        slack = self.base_interval / 2
+        with self._lock:
+            return [
+                oid
+                for oid in oids
+                if oid not in self._last_checked
+                or self._last_checked[oid] + self._intervals.get(oid, self.base_interval)
+                <= now + slack
+            ]
+
+    def mark_checked(self, oid: str, when: Optional[datetime] = None):
+        """Запоминает время проверки справочника"""
+        with self._lock:
+            self._last_checked[oid] = when or datetime.now()
+
+
+class TokenBucket:
+    """Token bucket: не больше rate токенов в секунду, запас не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def try_acquire(self) -> bool:
+        """Забирает токен, если он есть"""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class RollingPollingPolicy:
+    """
+    Непрерывный обход справочников по кругу.
+
+    Каждый справочник проверяется один раз за период, проверки идут по
+    одной с шагом period / число справочников. Если обход отстал (ФНСИ
+    отвечал медленно или бот был остановлен), пропущенные проверки
+    догоняются, но не быстрее max_rpm запросов в минуту.
+    """
+
+    def __init__(self, oids: List[str], period: timedelta, max_rpm: float):
+        """
+        Args:
+            oids: справочники в порядке обхода
+            period: за какое время обходятся все справочники
+            max_rpm: предельное число проверок в минуту
+        """
+        self.oids = list(oids)
+        self.period = period
+        self.step = period.total_seconds() / max(1, len(self.oids))
+        self._bucket = TokenBucket(rate=max_rpm / 60)
+        self._cursor = 0
+        self._next_due = monotonic()
+        self._round_started = monotonic()
+        self._lock = Lock()
+
+        if max_rpm / 60 < 1 / self.step:
+            logger.warning(
+                f"Ограничение {max_rpm:g} запросов/мин не позволяет обойти "
+                f"{len(self.oids)} справочников за {period}: обход будет дольше"
+            )
+
+    def next_due(self) -> Optional[str]:
+        """
+        Следующий справочник, если подошло его время и есть токен.
+
+        Returns:
+            OID справочника или None
+        """
+        with self._lock:
+            now = monotonic()
+            # Отставание больше периода не догоняем - это был бы повторный круг
+            self._next_due = max(self._next_due, now - self.period.total_seconds())
+            if self._next_due > now or not self._bucket.try_acquire():
+                return None
+            oid = self.oids[self._cursor]
+            self._cursor = (self._cursor + 1) % len(self.oids)
+            self._next_due += self.step
+            return oid
+
+    def round_completed(self) -> Optional[float]:
+        """
+        Длительность круга в секундах, если только что завершён полный круг обхода.
+        """
+        with self._lock:
+            if self._cursor != 0:
+                return None
+            now = monotonic()
+            duration = now - self._round_started
+            self._round_started = now
+            return duration
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
@@ -2,15 +2,16 @@
 
 import logging
 from dataclasses import dataclass
+from threading import Lock
 
-from cachetools import TTLCache
+from cachetools import LRUCache, TTLCache
 from telebot.types import CallbackQuery, Message
 
 from services.database_service import add_log
 from utils.message_manager import cleanup_previous_message, get_message_manager
 
 from .keyboards import get_back_button, get_search_results_keyboard
-from .semd_logic import SEMD1520  # TODO сделать класс общим
+from .semd_logic import get_semd1520
 
 logger = logging.getLogger(__name__)
 
@@ -30,15 +31,63 @@ class SEMDHandlers:
     # Cache settings
     _CACHE_MAXSIZE = 100
     _CACHE_TTL = 300  # 5 minutes
+    # Rendered version screens kept per dictionary version
+    _RESPONSE_CACHE_MAXSIZE = 256
 
     def __init__(self, bot, config):
         self.bot = bot
         self.config = config
-        self.semd = SEMD1520()
+        self.semd = get_semd1520()
         # Store search results per user for pagination (TTLCache with auto-expiry)
         self._user_searches: TTLCache[int, SearchCache] = TTLCache(
             maxsize=self._CACHE_MAXSIZE, ttl=self._CACHE_TTL
         )
+        # Rendered version screens: (dictionary version, TYPE) -> HTML
+        self._responses: LRUCache[tuple[str, int], str] = LRUCache(
+            maxsize=self._RESPONSE_CACHE_MAXSIZE
+        )
+        self._responses_version = None
+        self._responses_lock = Lock()
+
+    def _get_versions_response(self, doc_type: int) -> tuple[str | None, str | None]:
+        """
+        Get rendered versions screen for a document TYPE.
+
+        Screens are cached per (dictionary version, TYPE); the cache is
+        cleared when a new dictionary version appears.
+
+        Returns:
+            Tuple: (response_html, error_text) - one of them is None
+        """
+        snapshot = self.semd.get_snapshot()
+        if snapshot is not None:
+            with self._responses_lock:
+                response = self._responses.get((snapshot.version, doc_type))
+            if response is not None:
+                return response, None
+
+        name, versions, _, link_1520, link_1522, dict_version = (
+            self.semd.get_semd_versions_by_type(doc_type)
+        )
+        if name is None:
+            return None, versions
+
+        response = (
+            f"🏥 <b>{name}</b>\n\n"
+            f"<b>Доступные версии (v{dict_version}):</b>\n"
+            f"<pre>{versions}</pre>\n\n"
+            f"<b>Справочники НСИ:</b>\n"
+            f"• Все версии этого СЭМД {link_1520}\n"
+            f"• Вид ЭМД этого СЭМД {link_1522}\n\n"
+            f"<i>Введите OID или название для нового поиска</i>"
+        )
+
+        with self._responses_lock:
+            if dict_version != self._responses_version:
+                self._responses.clear()
+                self._responses_version = dict_version
+            self._responses[(dict_version, doc_type)] = response
+        return response, None
 
     def handle_semd_search(self, message: Message):
         """Handle text messages - search for SEMD by OID or name"""
@@ -58,11 +107,12 @@ class SEMDHandlers:
             # Try to parse as OID (numeric)
             try:
                 semd_oid = int(search_text)
-                name, versions, doc_type, link_1520, link_1522, dict_version = (
-                    self.semd.get_semd_versions(semd_oid)
-                )
+                doc_type = self.semd.get_type_by_oid(semd_oid)
+                response = None
+                if doc_type is not None:
+                    response, _ = self._get_versions_response(doc_type)
 
-                if name is None:
+                if response is None:
                     markup = get_back_button()
                     sent_msg = self.bot.send_message(
                         message.chat.id,
@@ -75,17 +125,6 @@ class SEMDHandlers:
                     )
                     return
 
-                # Format response
-                response = (
-                    f"🏥 <b>{name}</b>\n\n"
-                    f"<b>Доступные версии (v{dict_version}):</b>\n"
-                    f"<pre>{versions}</pre>\n\n"
-                    f"<b>Справочники НСИ:</b>\n"
-                    f"• Все версии этого СЭМД {link_1520}\n"
-                    f"• Вид ЭМД этого СЭМД {link_1522}\n\n"
-                    f"<i>Введите OID или название для нового поиска</i>"
-                )
-
                 markup = get_back_button()
                 sent_msg = self.bot.send_message(
                     message.chat.id, response, parse_mode="html", reply_markup=markup
@@ -230,17 +269,15 @@ class SEMDHandlers:
             # Parse callback data: "semd_t:{TYPE}"
             doc_type = int(call.data.split(":")[1])
 
-            # Get versions for this TYPE
-            name, versions, dtype, link_1520, link_1522, dict_version = (
-                self.semd.get_semd_versions_by_type(doc_type)
-            )
+            # Get rendered versions screen for this TYPE
+            response, error_text = self._get_versions_response(doc_type)
 
-            if name is None:
+            if response is None:
                 markup = get_back_button()
                 self.bot.edit_message_text(
                     chat_id=call.message.chat.id,
                     message_id=call.message.message_id,
-                    text=f"❌ {versions}",
+                    text=f"❌ {error_text}",
                     reply_markup=markup,
                 )
                 get_message_manager().update_message(
@@ -249,17 +286,6 @@ class SEMDHandlers:
                 self.bot.answer_callback_query(call.id)
                 return
 
-            # Format response (same as OID search)
-            response = (
-                f"🏥 <b>{name}</b>\n\n"
-                f"<b>Доступные версии (v{dict_version}):</b>\n"
-                f"<pre>{versions}</pre>\n\n"
-                f"<b>Справочники НСИ:</b>\n"
-                f"• Все версии этого СЭМД {link_1520}\n"
-                f"• Вид ЭМД этого СЭМД {link_1522}\n\n"
-                f"<i>Введите OID или название для нового поиска</i>"
-            )
-
             markup = get_back_button()
             self.bot.edit_message_text(
                 chat_id=call.message.chat.id,
@@ -0,0 +1,132 @@
+"""Full-text search index over SEMD 1520 document names"""
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Words are sequences of letters/digits; everything else separates tokens
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Scores of a single query token match against an indexed word
+_EXACT_SCORE = 3
+_PREFIX_SCORE = 2
+_SUBSTRING_SCORE = 1
+# Bonus when the whole query occurs in the name as a phrase
+_PHRASE_BONUS = 2
+
+
+def normalize(text: str) -> str:
+    """Case-fold text and unify «ё» → «е» for Russian search"""
+    return text.casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized word tokens"""
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(word: str) -> Set[str]:
+    """Return the set of character trigrams of a word"""
+    return {word[i : i + 3] for i in range(len(word) - 2)}
+
+
+class SEMDSearchIndex:
+    """
+    Inverted word index with a trigram index over its vocabulary.
+
+    Documents are grouped by TYPE: every TYPE is searchable by the words of all
+    its versions' names. Query words may be partial (substring of a word) and
+    are matched in any order; all query words must match.
+    """
+
+    def __init__(self, documents: Iterable[Tuple[int, str, Iterable[str]]]):
+        """
+        Args:
+            documents: iterable of (TYPE, display_name, names), where names are
+                all NAME values of the TYPE
+        """
+        self._display_names: Dict[int, str] = {}
+        self._texts: Dict[int, str] = {}
+        self._word_types: Dict[str, Set[int]] = defaultdict(set)
+        self._trigram_words: Dict[str, Set[str]] = defaultdict(set)
+
+        for doc_type, display_name, names in documents:
+            self._display_names[doc_type] = display_name
+            normalized = [normalize(name) for name in names]
+            # Words are joined with a separator, so phrases don't cross names
+            self._texts[doc_type] = "\n".join(
+                " ".join(_TOKEN_RE.findall(name)) for name in normalized
+            )
+            for name in normalized:
+                for word in _TOKEN_RE.findall(name):
+                    self._word_types[word].add(doc_type)
+
+        for word in self._word_types:
+            for trigram in trigrams(word):
+                self._trigram_words[trigram].add(word)
+
+    def __len__(self) -> int:
+        return len(self._display_names)
+
+    def _match_words(self, token: str) -> List[str]:
+        """Find vocabulary words containing the query token"""
+        if len(token) < 3:
+            # Too short for trigrams: scan the vocabulary (thousands of words)
+            return [word for word in self._word_types if token in word]
+
+        postings = sorted(
+            (self._trigram_words.get(t, set()) for t in trigrams(token)), key=len
+        )
+        if not postings[0]:
+            return []
+        # Trigram intersection may give false positives (e.g. reordered trigrams)
+        return [word for word in set.intersection(*postings) if token in word]
+
+    def search(self, query: str) -> List[Tuple[int, str]]:
+        """
+        Search document types by name.
+
+        Args:
+            query: Search string, one or more (partial) words in any order
+
+        Returns:
+            List of (TYPE, display_name), best matches first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores: Dict[int, int] = {}
+        for position, token in enumerate(dict.fromkeys(tokens)):
+            token_scores: Dict[int, int] = {}
+            for word in self._match_words(token):
+                if word == token:
+                    score = _EXACT_SCORE
+                elif word.startswith(token):
+                    score = _PREFIX_SCORE
+                else:
+                    score = _SUBSTRING_SCORE
+                for doc_type in self._word_types[word]:
+                    if token_scores.get(doc_type, 0) < score:
+                        token_scores[doc_type] = score
+
+            # Every query word must match: intersect with previous results
+            if position == 0:
+                scores = token_scores
+            else:
+                scores = {
+                    doc_type: scores[doc_type] + score
+                    for doc_type, score in token_scores.items()
+                    if doc_type in scores
+                }
+            if not scores:
+                return []
+
+        phrase = " ".join(tokens)
+        if len(tokens) > 1:
+            for doc_type in scores:
+                if phrase in self._texts[doc_type]:
+                    scores[doc_type] += _PHRASE_BONUS
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(doc_type, self._display_names[doc_type]) for doc_type, _ in ranked]
@@ -1,15 +1,22 @@
 """SEMD (Structured Electronic Medical Documents) logic and utilities"""
 
 import logging
-import sqlite3
+import os
 import time
-from datetime import datetime
+import zipfile
+from pathlib import Path
+from threading import Lock, Thread
 
 import pandas as pd
 from tabulate import tabulate
 
 from config import get_config
+from services.dictionary_registry import get_dictionary_registry
+from utils.database import get_fnsi_db
 from utils.file_utils import download_file
+from utils.memory_utils import RSSSampler
+
+from .search_index import SEMDSearchIndex
 
 logger = logging.getLogger(__name__)
 
@@ -22,49 +29,97 @@ class SEMDVersionFetcher:
     def __init__(self, fnsi_id):
         self.fnsi_id = fnsi_id
         self.latest = self.get_version()
-        self.release_notes = self.get_release_notes()
+
+    @property
+    def release_notes(self):
+        """Release notes for latest version (read on demand)"""
+        return self.get_release_notes()
 
     def get_version(self):
         """Get latest version of SEMD from database"""
-        con = sqlite3.connect(cfg.paths.fnsi_db_path)
-        cur = con.cursor()
         try:
-            cur.execute(
+            result = get_fnsi_db().connection().execute(
                 "SELECT version FROM nsi_passport "
                 "WHERE ID = ? "
                 "ORDER by lastUpdate DESC limit 1",
                 [self.fnsi_id],
-            )
-            result = cur.fetchone()
+            ).fetchone()
             ver = result[0] if result else "empty version"
         except Exception as e:
             logger.warning(f"Warning: {e}")
             ver = "empty version"
-        finally:
-            con.close()
         return ver
 
     def get_release_notes(self):
         """Get release notes for latest version"""
-        con = sqlite3.connect(cfg.paths.fnsi_db_path)
-        cur = con.cursor()
         try:
-            cur.execute(
+            result = get_fnsi_db().connection().execute(
                 "SELECT releaseNotes FROM nsi_passport "
                 "WHERE ID = ? AND version = ? "
                 "ORDER by lastUpdate DESC limit 1",
                 [self.fnsi_id, self.latest],
-            )
-            result = cur.fetchone()
+            ).fetchone()
             rel_notes = result[0] if result else "empty notes"
         except Exception as e:
             logger.warning(f"Warning: {e}")
             rel_notes = "empty notes"
-        finally:
-            con.close()
         return rel_notes
 
 
+class SEMDSnapshot:
+    """
+    Parsed SEMD 1520 dictionary version with lookup indexes.
+
+    Snapshots are shared between plugins through the dictionary registry
+    and must be treated as read-only.
+    """
+
+    def __init__(self, version: str, df: pd.DataFrame):
+        self.version = version
+        self.df = df
+        # OID → TYPE and TYPE → (name, pre-sorted versions table)
+        self.oid_to_type = {}
+        self.type_index = {}
+        self.search_index = SEMDSearchIndex([])
+        self._build_index()
+
+    def _build_index(self):
+        """Build lookup indexes once per dictionary version.
+
+        - OID → TYPE
+        - TYPE → (document name, versions sorted by OID with formatted dates)
+        - full-text search index over NAME, grouped by TYPE
+
+        Lookups by OID or TYPE become a dict hit instead of a DataFrame scan.
+        """
+        ordered = self.df.sort_values("OID")
+        self.oid_to_type = dict(
+            zip(ordered["OID"].astype(int), ordered["TYPE"].astype(int))
+        )
+
+        formatted = ordered.loc[:, ["OID", "TYPE", "NAME"]].copy()
+        formatted["START_DATE"] = ordered["START_DATE"].dt.strftime("%d.%m.%y")
+        formatted["END_DATE"] = ordered["END_DATE"].dt.strftime("%d.%m.%y")
+
+        type_index = {}
+        documents = []
+        for doc_type, group in formatted.groupby("TYPE", sort=False):
+            name = f"{group['NAME'].iloc[-1].split('(CDA)')[0]}"
+            versions = group.loc[:, ["OID", "START_DATE", "END_DATE"]].reset_index(
+                drop=True
+            )
+            type_index[int(doc_type)] = (name, versions)
+
+            # Clean up name for button display (max ~40 chars)
+            display_name = name.strip()
+            if len(display_name) > 40:
+                display_name = display_name[:37] + "..."
+            names = group["NAME"].dropna().astype(str).unique()
+            documents.append((int(doc_type), display_name, names))
+        self.type_index = type_index
+        self.search_index = SEMDSearchIndex(documents)
+
+
 class SEMD1520:
     """
     SEMD 1520 - Medical Document Structure Dictionary.
@@ -75,64 +130,237 @@ class SEMD1520:
     SEMD_OID = "1.2.643.5.1.13.13.11.1520"
     # Check version at most once per this interval (seconds)
     VERSION_CHECK_INTERVAL = 60
+    # Bump when parsing logic changes to invalidate existing snapshots
+    SNAPSHOT_FORMAT = 2
+    # Columns read from the CSV archive and their compact dtypes
+    CSV_DTYPES = {
+        "OID": "int32",
+        "TYPE": "int32",
+        "NAME": "object",
+        # Small integer code, stored as category after parsing
+        "FORMAT": "Int8",
+        "START_DATE": "object",
+        "END_DATE": "object",
+    }
+    CSV_DATE_FORMAT = "%d.%m.%Y"
 
     def __init__(self):
         self.id = self.SEMD_OID
         self.version_fetcher = SEMDVersionFetcher(self.id)
         self.latest_version = self.version_fetcher.latest
-        self.df = None
+        self.snapshot = None
         self._last_version_check = 0.0
+        self._reload_lock = Lock()
+        self._reload_thread = None
         self._load_data()
 
-    def _load_data(self):
-        """Load SEMD 1520 data from CSV file"""
-        try:
-            download_file(self.id, self.latest_version)
-            self.df = pd.read_csv(
-                f"{cfg.paths.files_dir}/{self.id}_{self.latest_version}_csv.zip",
-                sep=";",
-                parse_dates=["START_DATE", "END_DATE"],
-                dayfirst=True,
+    @property
+    def df(self):
+        """Parsed dictionary table of the current version (read-only) or None"""
+        snapshot = self.snapshot
+        return snapshot.df if snapshot is not None else None
+
+    def _snapshot_path(self, version) -> Path:
+        """Path of the parsed dictionary snapshot for a version"""
+        return Path(cfg.paths.files_dir) / (
+            f"{self.id}_{version}_v{self.SNAPSHOT_FORMAT}.pkl"
+        )
+
+    @classmethod
+    def _parse_dates(cls, values: pd.Series) -> pd.Series:
+        """Parse dd.mm.yyyy dates with a fixed format, falling back to inference"""
+        parsed = pd.to_datetime(values, format=cls.CSV_DATE_FORMAT, errors="coerce")
+        if parsed.isna().sum() > values.isna().sum():
+            logger.warning(
+                f"Unexpected date format in SEMD 1520 column {values.name}, "
+                f"falling back to dayfirst parsing"
             )
-            # Select only needed columns
-            self.df = self.df.loc[
-                :, ["OID", "TYPE", "NAME", "START_DATE", "END_DATE", "FORMAT"]
-            ]
-
-            # Add status column
-            self.df["EXPIRED"] = self.df["END_DATE"].apply(
-                lambda x: "запланирован вывод"
-                if x and x > datetime.now()
-                else ("выведен" if x and x < datetime.now() else "активно")
-            )
-            logger.info(
-                f"SEMD 1520 data loaded successfully (version {self.latest_version})"
+            parsed = pd.to_datetime(values, dayfirst=True)
+        return parsed
+
+    def _read_csv(self, version) -> pd.DataFrame:
+        """Parse downloaded SEMD 1520 CSV archive.
+
+        Only needed columns are read, with compact dtypes, streaming straight
+        from the archive member.
+        """
+        path = f"{cfg.paths.files_dir}/{self.id}_{version}_csv.zip"
+        with zipfile.ZipFile(path) as archive:
+            member = next(
+                (name for name in archive.namelist() if name.lower().endswith(".csv")),
+                None,
             )
+            if member is None:
+                raise ValueError(f"No CSV file in SEMD 1520 archive {path}")
+            with archive.open(member) as stream:
+                df = pd.read_csv(
+                    stream,
+                    sep=";",
+                    usecols=list(self.CSV_DTYPES),
+                    dtype=self.CSV_DTYPES,
+                )
+        df["START_DATE"] = self._parse_dates(df["START_DATE"])
+        df["END_DATE"] = self._parse_dates(df["END_DATE"])
+        df["FORMAT"] = df["FORMAT"].astype("category")
+
+        df = df.loc[:, ["OID", "TYPE", "NAME", "START_DATE", "END_DATE", "FORMAT"]]
+        table_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        logger.info(
+            f"SEMD 1520 CSV parsed (version {version}): {len(df)} rows, "
+            f"table {table_mb:.1f} MB"
+        )
+        return df
+
+    def _read_snapshot(self, version):
+        """Load parsed table from snapshot, None if there is no usable snapshot"""
+        path = self._snapshot_path(version)
+        if not path.exists():
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"Broken SEMD 1520 snapshot {path.name}, re-parsing CSV: {e}")
+            return None
+
+    def _write_snapshot(self, version, df: pd.DataFrame):
+        """Persist parsed table and remove snapshots of other versions"""
+        path = self._snapshot_path(version)
+        try:
+            # Write to a temporary file first so readers never see a partial file
+            tmp_path = path.with_suffix(".tmp")
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+            for stale in path.parent.glob(f"{self.id}_*.pkl"):
+                if stale != path:
+                    stale.unlink()
+        except Exception as e:
+            logger.warning(f"Could not save SEMD 1520 snapshot {path.name}: {e}")
+
+    def _build_snapshot(self, version):
+        """Load SEMD 1520 data from file snapshot or, if absent, from CSV file.
+
+        RSS is sampled while the CSV is parsed and the snapshot is built,
+        since the reload spike matters on a small server.
+        """
+        try:
+            df = self._read_snapshot(version)
+            if df is not None:
+                snapshot = SEMDSnapshot(version, df)
+            else:
+                download_file(self.id, version)
+                with RSSSampler() as rss:
+                    df = self._read_csv(version)
+                    self._write_snapshot(version, df)
+                    snapshot = SEMDSnapshot(version, df)
+                logger.info(
+                    f"SEMD 1520 snapshot built (version {version}): "
+                    f"RSS {rss.start:.0f} → {rss.end:.0f} MB, peak {rss.peak:.0f} MB"
+                )
+            logger.info(f"SEMD 1520 data loaded successfully (version {version})")
+            return snapshot
         except Exception as e:
             logger.error(f"Error loading SEMD 1520 dictionary: {e}")
-            self.df = None
+            return None
+
+    def _load_version(self, version):
+        """Get a version snapshot from the shared dictionary registry"""
+        return get_dictionary_registry().get_or_load(
+            self.id, version, lambda: self._build_snapshot(version)
+        )
 
-    def _check_and_reload_if_needed(self):
+    def _load_data(self):
+        """Load the current version synchronously (used on startup)"""
+        self.snapshot = self._load_version(self.latest_version)
+
+    def _reload(self, version):
+        """Build a new version snapshot off the request path and swap it in"""
+        snapshot = self._load_version(version)
+        if snapshot is None:
+            logger.warning(
+                f"SEMD 1520 version {version} not loaded, "
+                f"keep serving version {self.latest_version}"
+            )
+            return
+
+        previous_version = self.latest_version
+        # Single reference assignment: readers see either the old or the new
+        # snapshot, never a partially loaded one
+        self.snapshot = snapshot
+        self.latest_version = version
+        logger.info(f"SEMD 1520 version updated: {previous_version} → {version}")
+
+    def _start_reload(self, version) -> Thread:
+        """Start background reload unless one is already running"""
+        with self._reload_lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return self._reload_thread
+            self._reload_thread = Thread(
+                target=self._reload,
+                args=(version,),
+                name="semd1520-reload",
+                daemon=True,
+            )
+            self._reload_thread.start()
+            return self._reload_thread
+
+    def _check_and_reload_if_needed(self, force: bool = False):
         """Check if version has been updated in database and reload data if needed.
 
         Version check is throttled to once per VERSION_CHECK_INTERVAL seconds
         to avoid excessive database queries on frequent search requests.
+        The reload itself runs in a background thread: requests keep being
+        served from the previous version until the new one is ready.
+
+        Args:
+            force: check the version regardless of the throttle interval
+
+        Returns:
+            Reload thread if a reload was started or is running, None otherwise
         """
         now = time.time()
-        if now - self._last_version_check < self.VERSION_CHECK_INTERVAL:
-            return  # Skip check, too soon since last check
+        if not force and now - self._last_version_check < self.VERSION_CHECK_INTERVAL:
+            return None  # Skip check, too soon since last check
 
         self._last_version_check = now
         try:
             current_version = self.version_fetcher.get_version()
-            if current_version != self.latest_version:
-                logger.info(
-                    f"SEMD 1520 version updated: {self.latest_version} → {current_version}"
-                )
-                self.latest_version = current_version
-                self._load_data()
+            # Reload on version change, or retry if previous load failed
+            if current_version != self.latest_version or self.snapshot is None:
+                return self._start_reload(current_version)
         except Exception as e:
             logger.warning(f"Error checking SEMD 1520 version update: {e}")
+        return None
+
+    def refresh(self):
+        """Check the dictionary version right now and wait for the reload if it changed"""
+        reload_thread = self._check_and_reload_if_needed(force=True)
+        if reload_thread is not None:
+            reload_thread.join()
+
+    def get_snapshot(self):
+        """
+        Get the snapshot of the current dictionary version.
+
+        Returns:
+            SEMDSnapshot or None if data is not loaded
+        """
+        self._check_and_reload_if_needed()
+        return self.snapshot
+
+    def get_type_by_oid(self, semd_oid):
+        """
+        Find document TYPE by SEMD OID.
+
+        Args:
+            semd_oid: SEMD OID to search for
+
+        Returns:
+            Document TYPE or None if not found or data is not loaded
+        """
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.oid_to_type.get(int(semd_oid))
 
     def get_semd_versions(self, semd_oid):
         """
@@ -147,7 +375,8 @@ class SEMD1520:
         # Check if version has been updated and reload if needed
         self._check_and_reload_if_needed()
 
-        if self.df is None:
+        snapshot = self.snapshot
+        if snapshot is None:
             return (
                 None,
                 "Ошибка: не удалось загрузить данные СЭМД",
@@ -159,58 +388,11 @@ class SEMD1520:
 
         try:
             # Find document type by OID
-            semd_type_row = self.df[self.df["OID"] == int(semd_oid)]
-            if semd_type_row.empty:
+            doc_type = snapshot.oid_to_type.get(int(semd_oid))
+            if doc_type is None:
                 return None, f"СЭМД с OID {semd_oid} не найдена", None, None, None, None
 
-            doc_type = semd_type_row["TYPE"].iloc[0]
-
-            # Get all versions for this document type
-            semd_versions = self.df[self.df["TYPE"] == doc_type].copy()
-            semd_versions = semd_versions.sort_values("OID")
-
-            # Format dates
-            semd_versions["START_DATE"] = semd_versions["START_DATE"].dt.strftime(
-                "%d.%m.%y"
-            )
-            semd_versions["END_DATE"] = semd_versions["END_DATE"].dt.strftime(
-                "%d.%m.%y"
-            )
-
-            # Get document name
-            name = f"{semd_versions['NAME'].iloc[-1].split('(CDA)')[0]}"
-
-            # Create links to NSI
-            link_1520 = (
-                f"<a href='https://nsi.rosminzdrav.ru/dictionaries/"
-                f"1.2.643.5.1.13.13.11.1520/passport/latest"
-                f"#filters=TYPE%7C{doc_type}%7CGTE&filters=TYPE%7C{doc_type}%7CLTE'>🔗</a>"
-            )
-            link_1522 = (
-                f"<a href='https://nsi.rosminzdrav.ru/dictionaries/"
-                f"1.2.643.5.1.13.13.11.1522/passport/latest"
-                f"#filters=RECID%7C{doc_type}%7CGTE&filters=RECID%7C{doc_type}%7CLTE'>🔗</a>"
-            )
-
-            # Format as table
-            semd_versions = semd_versions.loc[
-                :, ["OID", "START_DATE", "END_DATE"]
-            ].reset_index(drop=True)
-            versions_table = tabulate(
-                semd_versions,
-                showindex=False,
-                tablefmt="simple",
-                headers=["ID", "Start", "Stop"],
-            )
-
-            return (
-                name,
-                versions_table,
-                doc_type,
-                link_1520,
-                link_1522,
-                self.latest_version,
-            )
+            return self._format_versions(snapshot, doc_type)
 
         except Exception as e:
             logger.error(f"Error getting SEMD versions: {e}")
@@ -229,11 +411,12 @@ class SEMD1520:
         # Check if version has been updated and reload if needed
         self._check_and_reload_if_needed()
 
-        if self.df is None:
+        snapshot = self.snapshot
+        if snapshot is None:
             return None
 
         try:
-            newest = self.df.sort_values(
+            newest = snapshot.df.sort_values(
                 ["TYPE", "START_DATE"], ascending=[True, False]
             )
             newest = newest.loc[newest["END_DATE"].isnull()]  # Active versions only
@@ -250,8 +433,11 @@ class SEMD1520:
         """
         Search SEMD documents by name.
 
+        Words of the query are matched in any order, case-insensitively,
+        as whole words or word fragments. Results are ranked by match quality.
+
         Args:
-            query: Search string (case-insensitive)
+            query: Search string
             limit: Maximum number of unique document types to return (None = all)
             offset: Number of results to skip (for pagination)
 
@@ -262,35 +448,12 @@ class SEMD1520:
         """
         self._check_and_reload_if_needed()
 
-        if self.df is None or not query.strip():
+        snapshot = self.snapshot
+        if snapshot is None or not query.strip():
             return [], 0
 
         try:
-            # Case-insensitive search in NAME column
-            mask = self.df["NAME"].str.contains(query, case=False, na=False)
-            matches = self.df[mask].copy()
-
-            if matches.empty:
-                return [], 0
-
-            # Group by TYPE and get one representative NAME per type
-            # Take the latest version's name (highest OID within each TYPE)
-            grouped = (
-                matches.sort_values("OID", ascending=False).groupby("TYPE").first()
-            )
-
-            # Create result list with (TYPE, display_name)
-            all_results = []
-            for doc_type, row in grouped.iterrows():
-                # Clean up name: remove "(CDA)" suffix
-                display_name = row["NAME"].split("(CDA)")[0].strip()
-                # Truncate long names for button display (max ~40 chars)
-                if len(display_name) > 40:
-                    display_name = display_name[:37] + "..."
-                all_results.append((int(doc_type), display_name))
-
-            # Sort by TYPE
-            all_results.sort(key=lambda x: x[0])
+            all_results = snapshot.search_index.search(query)
             total_count = len(all_results)
 
             # Apply pagination if limit specified
@@ -317,7 +480,8 @@ class SEMD1520:
         """
         self._check_and_reload_if_needed()
 
-        if self.df is None:
+        snapshot = self.snapshot
+        if snapshot is None:
             return (
                 None,
                 "Ошибка: не удалось загрузить данные СЭМД",
@@ -328,57 +492,68 @@ class SEMD1520:
             )
 
         try:
-            # Find all versions for this TYPE
-            semd_versions = self.df[self.df["TYPE"] == doc_type].copy()
-
-            if semd_versions.empty:
+            if int(doc_type) not in snapshot.type_index:
                 return None, f"СЭМД с TYPE {doc_type} не найден", None, None, None, None
 
-            semd_versions = semd_versions.sort_values("OID")
-
-            # Format dates
-            semd_versions["START_DATE"] = semd_versions["START_DATE"].dt.strftime(
-                "%d.%m.%y"
-            )
-            semd_versions["END_DATE"] = semd_versions["END_DATE"].dt.strftime(
-                "%d.%m.%y"
-            )
-
-            # Get document name
-            name = f"{semd_versions['NAME'].iloc[-1].split('(CDA)')[0]}"
-
-            # Create links to NSI
-            link_1520 = (
-                f"<a href='https://nsi.rosminzdrav.ru/dictionaries/"
-                f"1.2.643.5.1.13.13.11.1520/passport/latest"
-                f"#filters=TYPE%7C{doc_type}%7CGTE&filters=TYPE%7C{doc_type}%7CLTE'>🔗</a>"
-            )
-            link_1522 = (
-                f"<a href='https://nsi.rosminzdrav.ru/dictionaries/"
-                f"1.2.643.5.1.13.13.11.1522/passport/latest"
-                f"#filters=RECID%7C{doc_type}%7CGTE&filters=RECID%7C{doc_type}%7CLTE'>🔗</a>"
-            )
-
-            # Format as table
-            versions_table_df = semd_versions.loc[
-                :, ["OID", "START_DATE", "END_DATE"]
-            ].reset_index(drop=True)
-            versions_table = tabulate(
-                versions_table_df,
-                showindex=False,
-                tablefmt="simple",
-                headers=["ID", "Start", "Stop"],
-            )
-
-            return (
-                name,
-                versions_table,
-                doc_type,
-                link_1520,
-                link_1522,
-                self.latest_version,
-            )
+            return self._format_versions(snapshot, int(doc_type))
 
         except Exception as e:
             logger.error(f"Error getting SEMD versions by type: {e}")
             return None, f"Ошибка при получении версий: {e}", None, None, None, None
+
+    @staticmethod
+    def _format_versions(snapshot: SEMDSnapshot, doc_type: int):
+        """
+        Build the versions response for an indexed document TYPE.
+
+        Args:
+            snapshot: Dictionary version snapshot
+            doc_type: Document type ID (must be present in the index)
+
+        Returns:
+            tuple: (document_name, versions_table, document_type, link_1520, link_1522, dictionary_version)
+        """
+        name, versions = snapshot.type_index[doc_type]
+
+        # Create links to NSI
+        link_1520 = (
+            f"<a href='https://nsi.rosminzdrav.ru/dictionaries/"
+            f"1.2.643.5.1.13.13.11.1520/passport/latest"
+            f"#filters=TYPE%7C{doc_type}%7CGTE&filters=TYPE%7C{doc_type}%7CLTE'>🔗</a>"
+        )
+        link_1522 = (
+            f"<a href='https://nsi.rosminzdrav.ru/dictionaries/"
+            f"1.2.643.5.1.13.13.11.1522/passport/latest"
+            f"#filters=RECID%7C{doc_type}%7CGTE&filters=RECID%7C{doc_type}%7CLTE'>🔗</a>"
+        )
+
+        # Format as table
+        versions_table = tabulate(
+            versions,
+            showindex=False,
+            tablefmt="simple",
+            headers=["ID", "Start", "Stop"],
+        )
+
+        return (
+            name,
+            versions_table,
+            doc_type,
+            link_1520,
+            link_1522,
+            snapshot.version,
+        )
+
+
+# Shared SEMD 1520 instance for all plugins
+_semd1520 = None
+_semd1520_lock = Lock()
+
+
+def get_semd1520() -> SEMD1520:
+    """Get the shared SEMD1520 instance, creating it on first use."""
+    global _semd1520
+    with _semd1520_lock:
+        if _semd1520 is None:
+            _semd1520 = SEMD1520()
+        return _semd1520
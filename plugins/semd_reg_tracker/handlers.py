@@ -27,14 +27,16 @@ class SEMDRegistrationHandlers:
         Возвращает True если успешно, False если ошибка
         """
         try:
-            from plugins.semd_checker.semd_logic import SEMD1520 #TODO сделать класс общим
+            from plugins.semd_checker.semd_logic import get_semd1520
 
-            # Загружаем справочник SEMD1520 через существующий класс
-            semd = SEMD1520()
+            # Общий экземпляр SEMD1520: справочник разбирается один раз на версию
+            semd = get_semd1520()
+            semd.refresh()
+            df = semd.df
 
-            if semd.df is not None and not semd.df.empty:
-                # Используем DataFrame из SEMD1520
-                self.semd1520 = semd.df.copy()
+            if df is not None and not df.empty:
+                # DataFrame общий для всех плагинов - только чтение, без копии
+                self.semd1520 = df
                 self.logger.info(f"Справочник SEMD1520 загружен: {len(self.semd1520)} записей")
                 return True
             else:
@@ -1,8 +1,12 @@
 from typing import List, Dict, Any
 from plugins.base import BasePlugin
+from core.triggers import monthly_cron, quarterly_cron
 from .handlers import SEMDRegistrationHandlers
 import logging
-from datetime import datetime
+
+# Месяцы, в начале которых отправляется месячная сводка
+# (в начале квартала вместо неё отправляется квартальная)
+_NON_QUARTER_MONTHS = "2,3,5,6,8,9,11,12"
 
 
 class Plugin(BasePlugin):
@@ -49,25 +53,29 @@ class Plugin(BasePlugin):
     def get_scheduled_tasks(self) -> List[Dict[str, Any]]:
         """
         Возвращает две задачи:
-        1. Ежемесячная проверка (1 мин в dev, 1 месяц в prod)
-        2. Ежеквартальная проверка (3 мин в dev, 1 квартал в prod)
+        1. Ежемесячная сводка (1 мин в dev; в prod 1 числа месяца в 10:00,
+           кроме начала квартала - тогда отправляется квартальная)
+        2. Ежеквартальная сводка (3 мин в dev; в prod 1.01, 1.04, 1.07, 1.10 в 10:00)
         """
-        is_dev = self.config.app.env == 'development'
+        if self.config.app.env == 'development':
+            monthly = {'interval': 1, 'unit': 'minutes'}
+            quarterly = {'interval': 3, 'unit': 'minutes'}
+        else:
+            monthly = {'cron': monthly_cron('10:00', months=_NON_QUARTER_MONTHS)}
+            quarterly = {'cron': quarterly_cron('10:00')}
 
         tasks = [
             {
                 'func': self.check_monthly_updates,
-                'interval': 1 if is_dev else 1,
-                'unit': 'minutes' if is_dev else 'months',
-                'at': '10:00',  # Время выполнения
-                'task_name': 'monthly_semd_check'
+                **monthly,
+                'task_name': 'monthly_semd_check',
+                'timeout': 30 * 60
             },
             {
                 'func': self.check_quarterly_updates,
-                'interval': 3 if is_dev else 1,
-                'unit': 'minutes' if is_dev else 'quarters',
-                'at': '10:00',  # Время выполнения
-                'task_name': 'quarterly_semd_check'
+                **quarterly,
+                'task_name': 'quarterly_semd_check',
+                'timeout': 30 * 60
             }
         ]
 
@@ -75,31 +83,12 @@ class Plugin(BasePlugin):
 
     def check_monthly_updates(self):
         """
-        Проверяет и отправляет месячную сводку СЭМД
-        В production: выполняется 1 числа каждого месяца в 10:00
+        Отправляет месячную сводку СЭМД
+        В production: выполняется 1 числа каждого месяца в 10:00,
+        кроме начала квартала (приоритет квартальной сводке)
         В development: выполняется каждую минуту
-
-        Логика:
-        - Если сегодня 1 число и это начало квартала -> пропускаем (отправит квартальная задача)
-        - Иначе отправляем месячную сводку
         """
         try:
-            now = datetime.now()
-
-            # Проверяем, является ли текущая дата первым числом квартала
-            is_quarter_start = now.day == 1 and now.month in [1, 4, 7, 10]
-
-            # В production режиме проверяем день месяца
-            if self.config.app.env == 'production':
-                if now.day != 1:  # Выполняем только 1 числа месяца
-                    return
-                if is_quarter_start:  # Приоритет квартальной сводке
-                    self.logger.info(
-                        "Пропускаем месячную проверку - это начало квартала"
-                    )
-                    return
-
-            # Отправляем месячную сводку
             self.logger.info("Начало проверки месячных обновлений СЭМД")
             success = self.handlers.send_monthly_update()
 
@@ -113,25 +102,11 @@ class Plugin(BasePlugin):
 
     def check_quarterly_updates(self):
         """
-        Проверяет и отправляет квартальную сводку СЭМД
+        Отправляет квартальную сводку СЭМД
         В production: выполняется 1 числа каждого квартала (1.01, 1.04, 1.07, 1.10) в 10:00
         В development: выполняется каждые 3 минуты
-
-        Логика:
-        - Если сегодня 1 число и это начало квартала -> отправляем квартальную сводку
         """
         try:
-            now = datetime.now()
-
-            # Проверяем, является ли текущая дата первым числом квартала
-            is_quarter_start = now.day == 1 and now.month in [1, 4, 7, 10]
-
-            # В production режиме проверяем день и месяц
-            if self.config.app.env == 'production':
-                if not is_quarter_start:  # Выполняем только 1 числа квартала
-                    return
-
-            # Отправляем квартальную сводку
             self.logger.info("Начало проверки квартальных обновлений СЭМД")
             success = self.handlers.send_quarterly_update()
 
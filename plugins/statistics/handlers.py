@@ -1,15 +1,20 @@
 """Statistics plugin handlers"""
 import datetime
+import html
 import logging
 import pandas as pd
 from tabulate import tabulate
 from telebot.types import Message, CallbackQuery
 from utils.date_utils import next_weekday
 from utils.message_manager import get_message_manager, cleanup_previous_message
-from services.database_service import get_activity
+from core.scheduler import get_task_scheduler
+from services.database_service import get_activity_daily, get_scheduler_state
 
 logger = logging.getLogger(__name__)
 
+# Обозначения результата последнего запуска задачи
+_JOB_STATUS_ICONS = {'ok': '✅', 'error': '❌', 'running': '⏳'}
+
 
 class StatisticsHandlers:
     """Handlers for statistics plugin"""
@@ -39,31 +44,10 @@ class StatisticsHandlers:
             start_date = next_weekday(datetime.datetime.now().date(), 0, week)
             stop_date = start_date + datetime.timedelta(21)
 
-            # Get activity data
-            activity_data = get_activity(start_date, stop_date)
+            # Get daily activity counts of users (admins are counted separately)
+            activity_data = get_activity_daily(start_date, stop_date)
 
             if not activity_data:
-                from .keyboards import get_back_button
-                markup = get_back_button()
-                self.bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="📊 Нет данных активности за указанный период.",
-                    reply_markup=markup
-                )
-                # Update tracked message to current one
-                get_message_manager().update_message(call.message.chat.id, call.message.message_id, call.from_user.id)
-                self.bot.answer_callback_query(call.id)
-                return
-
-            # Process data
-            df = pd.DataFrame(activity_data, columns=['user_id', 'activity', 'date_time'])
-            df['date_time'] = pd.to_datetime(df['date_time'])
-
-            # Exclude admin from statistics
-            df = df[~df['user_id'].isin(self.config.accounts.admin_ids)]
-
-            if df.empty:
                 from .keyboards import get_back_button
                 markup = get_back_button()
                 self.bot.edit_message_text(
@@ -77,9 +61,13 @@ class StatisticsHandlers:
                 self.bot.answer_callback_query(call.id)
                 return
 
+            # Process data: at most days x activities rows, regardless of traffic
+            df = pd.DataFrame(activity_data, columns=['day', 'activity', 'events'])
+            df['day'] = pd.to_datetime(df['day'])
+
             # Create pivot table
-            df['week'] = df['date_time'].dt.isocalendar().week
-            df = df.pivot_table(index=['activity'], columns='week', values='user_id', aggfunc='count')
+            df['week'] = df['day'].dt.isocalendar().week
+            df = df.pivot_table(index=['activity'], columns='week', values='events', aggfunc='sum')
             df.index.name = None
             df = df.fillna(0)
 
@@ -112,3 +100,67 @@ class StatisticsHandlers:
         except Exception as e:
             self.logger.error(f"Error in statistics menu handler: {e}")
             self.bot.answer_callback_query(call.id, "❌ Ошибка при обработке запроса", show_alert=True)
+
+    @staticmethod
+    def _format_time(value) -> str:
+        """ISO-время из scheduler_state в коротком виде"""
+        if not value:
+            return '—'
+        try:
+            return datetime.datetime.fromisoformat(value).strftime('%d.%m.%Y %H:%M')
+        except ValueError:
+            return str(value)
+
+    def handle_jobs(self, message: Message):
+        """Handle /jobs command - show scheduler tasks state"""
+        try:
+            # Check admin access
+            if message.from_user.id not in self.config.accounts.admin_ids:
+                self.bot.send_message(
+                    message.chat.id,
+                    "❌ Доступ запрещен. Только для администраторов."
+                )
+                return
+
+            cleanup_previous_message(self.bot, message.chat.id)
+
+            states = get_scheduler_state()
+            # Счётчики с момента запуска бота (в scheduler_state не сохраняются)
+            scheduler = get_task_scheduler()
+            stats = {s['task_id']: s for s in scheduler.get_stats()} if scheduler else {}
+            if not states:
+                text = "⏱ Задачи планировщика ещё не запускались."
+            else:
+                text = "⏱ <b>Задачи планировщика:</b>\n"
+                for state in states.values():
+                    icon = _JOB_STATUS_ICONS.get(state['last_status'], '•')
+                    duration = state['last_duration']
+                    text += (
+                        f"\n{icon} <b>{state['task_id']}</b>\n"
+                        f"Расписание: {state['schedule'] or '—'}\n"
+                        f"Последний запуск: {self._format_time(state['last_occurrence'])}"
+                        + (f" ({duration:.1f} с)" if duration is not None else "")
+                        + f"\nПоследний успешный: {self._format_time(state['last_success'])}\n"
+                        f"Следующий: {self._format_time(state['next_run'])}\n"
+                        f"Запусков: {state['runs'] or 0}\n"
+                    )
+                    job_stats = stats.get(state['task_id'])
+                    if job_stats:
+                        text += (
+                            f"Задержка старта: {job_stats['last_lag']:.1f} с "
+                            f"(макс. {job_stats['max_lag']:.1f} с)\n"
+                            f"Пропущено: {job_stats['skipped']}, "
+                            f"таймаутов: {job_stats['timeouts']}\n"
+                        )
+                    if state['last_error']:
+                        text += f"Ошибка: <code>{html.escape(state['last_error'][:200])}</code>\n"
+
+            from .keyboards import get_back_button
+            markup = get_back_button()
+            sent_msg = self.bot.send_message(
+                message.chat.id, text, parse_mode='html', reply_markup=markup
+            )
+            get_message_manager().update_message(message.chat.id, sent_msg.message_id, message.from_user.id)
+        except Exception as e:
+            self.logger.error(f"Error in jobs handler: {e}")
+            self.bot.send_message(message.chat.id, "❌ Ошибка при обработке запроса")
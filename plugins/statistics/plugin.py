@@ -2,6 +2,7 @@
 import logging
 from typing import List, Dict, Any
 from plugins.base import BasePlugin
+from services.activity_retention import ActivityRetention
 from .handlers import StatisticsHandlers
 
 
@@ -17,6 +18,7 @@ class Plugin(BasePlugin):
         super().__init__(bot, config)
         self.logger = logging.getLogger(__name__)
         self.handlers = StatisticsHandlers(bot, config)
+        self.retention = ActivityRetention(config.database.activity_retention_days)
 
     def get_name(self) -> str:
         """Get plugin name"""
@@ -37,7 +39,12 @@ class Plugin(BasePlugin):
 
     def get_commands(self) -> List[Dict[str, Any]]:
         """Register commands"""
-        return []
+        return [
+            {
+                'params': {'commands': ['jobs']},
+                'handler': self.handlers.handle_jobs
+            }
+        ]
 
     def get_callbacks(self) -> List[Dict[str, Any]]:
         """Register callback handlers"""
@@ -48,6 +55,33 @@ class Plugin(BasePlugin):
             }
         ]
 
+    def get_scheduled_tasks(self) -> List[Dict[str, Any]]:
+        """
+        Daily activity log maintenance at DB_MAINTENANCE_AT
+        (every 5 minutes in development)
+        """
+        if self.config.app.env == 'development':
+            schedule = {'interval': 5, 'unit': 'minutes'}
+        else:
+            schedule = {'interval': 1, 'unit': 'days', 'at': self.config.database.maintenance_at}
+
+        return [
+            {
+                'func': self.maintain_activity_log,
+                **schedule,
+                'task_name': 'activity_retention',
+                'timeout': 30 * 60
+            }
+        ]
+
+    def maintain_activity_log(self):
+        """Move old activity log rows to the archive and reclaim free space"""
+        try:
+            self.retention.run()
+        except Exception as e:
+            self.logger.error(f"Error in activity log maintenance: {e}")
+            raise
+
     def shutdown(self):
         """Shutdown plugin"""
         self.logger.info(f"Plugin {self.get_name()} shutting down")
@@ -11,7 +11,6 @@
 
 import sys
 import sqlite3
-import shutil
 from pathlib import Path
 from datetime import datetime
 import argparse
@@ -47,7 +46,14 @@ def create_backup(db_path: Path) -> Path:
     backup_path = db_path.parent / f'fnsi_data_backup_{timestamp}.sqlite'
 
     try:
-        shutil.copy2(db_path, backup_path)
+        # Копия через backup API включает записи, ещё не перенесённые из WAL
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(backup_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
         logger.info(f"✅ Резервная копия создана: {backup_path}")
         return backup_path
     except Exception as e:
@@ -99,6 +105,9 @@ def delete_database(db_path: Path) -> bool:
     try:
         if db_path.exists():
             db_path.unlink()
+            # Журнал WAL удалённой базы нельзя оставлять рядом с новой
+            for suffix in ('-wal', '-shm'):
+                Path(f'{db_path}{suffix}').unlink(missing_ok=True)
             logger.info(f"✅ База данных удалена: {db_path}")
             return True
         return False
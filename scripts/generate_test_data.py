@@ -18,7 +18,7 @@ def generate_test_data():
     conn = sqlite3.connect(USER_DB_PATH)
     cursor = conn.cursor()
 
-    # Create tables if they don't exist
+    # Create tables if they don't exist (the bot migrates the schema on start)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY,
@@ -33,11 +33,22 @@ def generate_test_data():
         CREATE TABLE IF NOT EXISTS users_activity (
             id INTEGER,
             activity TEXT,
-            date_time TEXT
+            date_time INTEGER
         )
     ''')
 
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            day TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            user_kind TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (day, activity, user_kind)
+        ) WITHOUT ROWID
+    ''')
+
     # Clear existing test data
+    cursor.execute('DELETE FROM activity_daily')
     cursor.execute('DELETE FROM users_activity')
     cursor.execute('DELETE FROM users')
 
@@ -91,9 +102,16 @@ def generate_test_data():
 
         cursor.execute(
             'INSERT INTO users_activity (id, activity, date_time) VALUES (?, ?, ?)',
-            (user_id, activity, random_date.isoformat())
+            (user_id, activity, int(random_date.timestamp()))
         )
 
+    # Daily rollup read by the statistics screen (test users are not admins)
+    cursor.execute('''
+        INSERT INTO activity_daily (day, activity, user_kind, events)
+        SELECT date(date_time, 'unixepoch', 'localtime'), activity, 'user', count(*)
+        FROM users_activity GROUP BY 1, 2
+    ''')
+
     conn.commit()
     conn.close()
 
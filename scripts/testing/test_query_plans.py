@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки миграций схем баз и планов запросов.
+
+Создаёт во временном каталоге базы в схеме до появления миграций,
+применяет миграции (utils.migrations) и проверяет перенос данных и то,
+что частые запросы используют индексы, а не полный просмотр таблиц.
+Затем проверяет перенос старого журнала активности в архив.
+Рабочие базы из env/data не затрагиваются.
+"""
+
+import sys
+import csv
+import gzip
+import logging
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в path
+project_root = Path(__file__).parent.parent.parent  # scripts/testing -> scripts -> SEMD_bot
+sys.path.insert(0, str(project_root))
+
+# Загружаем конфиг и логирование
+from config import get_config
+
+cfg = get_config()
+
+from utils.logging_setup import setup_logging
+
+setup_logging(cfg)
+
+logger = logging.getLogger(__name__)
+
+from services.activity_retention import ActivityRetention
+from utils.database import SQLiteConnectionManager
+from utils.migrations import FNSI_DB_MIGRATIONS, USER_DB_MIGRATIONS
+
+# Запросы в том виде, в каком их выполняет бот
+ACTIVITY_RANGE_QUERY = (
+    'SELECT id, activity, date_time FROM users_activity'
+    ' WHERE date_time >= ? AND date_time < ? ORDER BY date_time'
+)
+ACTIVITY_DAILY_QUERY = (
+    'SELECT day, activity, events FROM activity_daily'
+    ' WHERE day >= ? AND day < ? AND user_kind = ?'
+)
+LATEST_VERSION_QUERY = (
+    "SELECT version FROM nsi_passport "
+    "WHERE ID = ? "
+    "ORDER by lastUpdate DESC limit 1"
+)
+RELEASE_NOTES_QUERY = (
+    "SELECT releaseNotes FROM nsi_passport "
+    "WHERE ID = ? AND version = ? "
+    "ORDER by lastUpdate DESC limit 1"
+)
+
+
+def create_legacy_databases(data_dir: Path):
+    """Базы в схеме до миграций (PRAGMA user_version = 0)"""
+    con = sqlite3.connect(data_dir / 'user_data.sqlite')
+    con.execute(
+        'CREATE TABLE users_activity (id INTEGER, activity TEXT, date_time TEXT)'
+    )
+    con.executemany(
+        'INSERT INTO users_activity (id, activity, date_time) VALUES (?, ?, ?)',
+        [
+            (1, '/start', '2025-03-01T10:00:00.123456'),
+            (1, '/menu', '2025-03-02T11:30:00'),
+            (2, '123', '2025-03-03T12:45:10.5'),
+        ]
+    )
+    con.commit()
+    con.close()
+
+    con = sqlite3.connect(data_dir / 'fnsi_data.sqlite')
+    con.execute(
+        'CREATE TABLE nsi_passport'
+        '(ID, Name, ShortName, lastUpdate, version, releaseNotes, add_date)'
+    )
+    rows = [
+        ('1.2.643.5.1.13.13.11.1520', 'СЭМД', 'СЭМД', '2025-01-01T00:00:00', '5.1', 'a', '2025-01-01T00:00:00'),
+        ('1.2.643.5.1.13.13.11.1520', 'СЭМД', 'СЭМД', '2025-02-01T00:00:00', '5.2', 'b', '2025-02-01T00:00:00'),
+        # Повтор той же версии - остаётся первая запись
+        ('1.2.643.5.1.13.13.11.1520', 'СЭМД', 'СЭМД', '2025-02-01T00:00:00', '5.2', 'dup', '2025-02-02T00:00:00'),
+        ('1.2.643.5.1.13.13.99.2.1', 'Другой', 'Др', '2025-01-15T00:00:00', '1.1', 'c', '2025-01-15T00:00:00'),
+    ]
+    con.executemany('INSERT INTO nsi_passport VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    con.commit()
+    con.close()
+
+
+def query_plan(con: sqlite3.Connection, query: str, params) -> str:
+    """План запроса одной строкой"""
+    rows = con.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def check_plan(con: sqlite3.Connection, name: str, query: str, params, index: str) -> bool:
+    plan = query_plan(con, query, params)
+    if index in plan and 'TEMP B-TREE' not in plan:
+        logger.info(f"✅ {name}: {plan}")
+        return True
+    logger.error(f"❌ {name}: ожидался индекс {index} без сортировки, план: {plan}")
+    return False
+
+
+def test_user_db(data_dir: Path) -> bool:
+    """Миграции user_data.sqlite и выборка активности по периоду"""
+    logger.info("\n👥 ТЕСТ: user_data.sqlite")
+    logger.info("-" * 50)
+
+    try:
+        manager = SQLiteConnectionManager(data_dir / 'user_data.sqlite', 5000, 0, USER_DB_MIGRATIONS)
+        con = manager.connection()
+
+        assert manager.schema_version == USER_DB_MIGRATIONS[-1].version, \
+            f"Версия схемы {manager.schema_version}"
+        logger.info(f"✅ Версия схемы: {manager.schema_version}")
+
+        # Таблицы, которых не было в старой базе, созданы
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert {'users', 'users_activity', 'scheduler_state'} <= tables, f"Таблицы: {tables}"
+        logger.info("✅ Таблицы users и scheduler_state созданы")
+
+        # Время переведено в секунды Unix
+        rows = con.execute('SELECT date_time, typeof(date_time) FROM users_activity ORDER BY rowid').fetchall()
+        expected = int(datetime.fromisoformat('2025-03-01T10:00:00.123456').timestamp())
+        assert len(rows) == 3, f"Перенесено {len(rows)} записей из 3"
+        assert all(kind == 'integer' for _, kind in rows), f"Типы: {rows}"
+        assert rows[0][0] == expected, f"{rows[0][0]} != {expected}"
+        logger.info("✅ date_time перенесено в секунды Unix")
+
+        # Сводка заполнена по существующему журналу
+        events = con.execute('SELECT sum(events) FROM activity_daily').fetchone()[0]
+        assert events == 3, f"В сводке {events} событий из 3"
+        logger.info("✅ activity_daily заполнена по журналу")
+
+        ok = check_plan(
+            con, 'Активность за период', ACTIVITY_RANGE_QUERY, (0, 1),
+            'idx_users_activity_date_time'
+        )
+        ok &= check_plan(
+            con, 'Сводка активности за период', ACTIVITY_DAILY_QUERY,
+            ('2025-03-01', '2025-03-22', 'user'), 'PRIMARY KEY'
+        )
+        manager.close_all()
+        return ok
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка: {e}", exc_info=True)
+        return False
+
+
+def test_fnsi_db(data_dir: Path) -> bool:
+    """Миграции fnsi_data.sqlite и запросы паспортов справочников"""
+    logger.info("\n📚 ТЕСТ: fnsi_data.sqlite")
+    logger.info("-" * 50)
+
+    try:
+        manager = SQLiteConnectionManager(data_dir / 'fnsi_data.sqlite', 5000, 0, FNSI_DB_MIGRATIONS)
+        con = manager.connection()
+
+        assert manager.schema_version == FNSI_DB_MIGRATIONS[-1].version, \
+            f"Версия схемы {manager.schema_version}"
+        logger.info(f"✅ Версия схемы: {manager.schema_version}")
+
+        # Повтор (ID, version) удалён, остальное перенесено
+        count = con.execute('SELECT count(*) FROM nsi_passport').fetchone()[0]
+        notes = con.execute(
+            "SELECT releaseNotes FROM nsi_passport WHERE version = '5.2'"
+        ).fetchone()[0]
+        assert count == 3 and notes == 'b', f"Записей {count}, releaseNotes '{notes}'"
+        logger.info("✅ Повторяющаяся версия удалена")
+
+        # UNIQUE(ID, version) не даёт добавить версию повторно
+        cur = con.execute(
+            "INSERT OR IGNORE INTO nsi_passport (ID, version) VALUES ('1.2.643.5.1.13.13.11.1520', '5.1')"
+        )
+        assert cur.rowcount == 0, "Повторная версия добавлена"
+        logger.info("✅ UNIQUE(ID, version) работает")
+
+        # Строки изменений версий не хранятся, только сводка
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert 'nsi_diff_rows' not in tables and 'nsi_diff_summary' in tables, f"Таблицы: {tables}"
+        logger.info("✅ nsi_diff_rows удалена, nsi_diff_summary на месте")
+
+        oid = '1.2.643.5.1.13.13.11.1520'
+        ok = check_plan(
+            con, 'Последняя версия справочника', LATEST_VERSION_QUERY, (oid,),
+            'idx_nsi_passport_id_last_update'
+        )
+        ok &= check_plan(
+            con, 'Описание версии', RELEASE_NOTES_QUERY, (oid, '5.2'),
+            'sqlite_autoindex_nsi_passport_1'
+        )
+        assert con.execute(LATEST_VERSION_QUERY, (oid,)).fetchone()[0] == '5.2'
+        manager.close_all()
+        return ok
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка: {e}", exc_info=True)
+        return False
+
+
+def test_migrations_idempotent(data_dir: Path) -> bool:
+    """Повторный запуск не применяет миграции заново"""
+    logger.info("\n🔁 ТЕСТ: Повторный запуск миграций")
+    logger.info("-" * 50)
+
+    try:
+        for name, migrations in (('user_data.sqlite', USER_DB_MIGRATIONS),
+                                 ('fnsi_data.sqlite', FNSI_DB_MIGRATIONS)):
+            path = data_dir / name
+            manager = SQLiteConnectionManager(path, 5000, 0, migrations)
+            count_before = manager.connection().execute(
+                "SELECT count(*) FROM sqlite_master"
+            ).fetchone()[0]
+            manager.close_all()
+
+            manager = SQLiteConnectionManager(path, 5000, 0, migrations)
+            count_after = manager.connection().execute(
+                "SELECT count(*) FROM sqlite_master"
+            ).fetchone()[0]
+            manager.close_all()
+            assert count_before == count_after, f"{name}: схема изменилась"
+        logger.info("✅ Схемы не изменились")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка: {e}", exc_info=True)
+        return False
+
+
+def test_activity_retention(data_dir: Path) -> bool:
+    """Перенос старого журнала в помесячные архивы и VACUUM"""
+    logger.info("\n🗄 ТЕСТ: Архив журнала активности")
+    logger.info("-" * 50)
+
+    try:
+        # Как get_user_db(): при первом соединении база переводится в auto_vacuum=INCREMENTAL
+        manager = SQLiteConnectionManager(
+            data_dir / 'user_data.sqlite', 5000, 0, USER_DB_MIGRATIONS, incremental_vacuum=True
+        )
+        con = manager.connection()
+        assert con.execute('PRAGMA auto_vacuum').fetchone()[0] == 2, "auto_vacuum не включён"
+        # Месяц старого журнала: 3000 записей по 2025-04, плюс записи за сегодня
+        start = int(datetime(2025, 4, 1).timestamp())
+        recent = int(datetime.now().timestamp())
+        rows = [(i % 7, '/menu', start + i * 60) for i in range(3000)]
+        rows += [(1, '/start', recent), (2, '/menu', recent)]
+        with manager.transaction() as conn:
+            conn.executemany('INSERT INTO users_activity (id, activity, date_time) VALUES (?, ?, ?)', rows)
+        daily_before = con.execute('SELECT sum(events) FROM activity_daily').fetchone()[0]
+
+        retention = ActivityRetention(30, data_dir / 'archive', manager)
+        result = retention.run()
+
+        # Записи за 2025-03 (из старой базы) и 2025-04 перенесены, свежие остались
+        assert result['archived'] == {'2025-03': 3, '2025-04': 3000}, f"Перенесено: {result['archived']}"
+        assert result['rows'] == 2, f"В журнале осталось {result['rows']} записей"
+        with gzip.open(retention.archive_path('2025-04'), 'rt', encoding='utf-8', newline='') as f:
+            archived = list(csv.reader(f))
+        assert archived[0] == ['id', 'activity', 'date_time'] and len(archived) == 3001, \
+            f"В архиве {len(archived)} строк"
+        logger.info(f"✅ В архив перенесено {sum(result['archived'].values())} записей")
+
+        # Сводка не изменилась
+        daily_after = con.execute('SELECT sum(events) FROM activity_daily').fetchone()[0]
+        assert daily_before == daily_after, f"Сводка {daily_before} -> {daily_after}"
+        logger.info("✅ activity_daily не изменилась")
+
+        # Свободные страницы возвращены файловой системе
+        assert result['reclaimed'] > 0, "Место не освобождено"
+        assert con.execute('PRAGMA freelist_count').fetchone()[0] == 0
+        logger.info(f"✅ VACUUM: освобождено {result['reclaimed']} байт")
+
+        # Повторный запуск ничего не переносит и не дописывает архив
+        size = retention.archive_path('2025-04').stat().st_size
+        assert retention.run()['archived'] == {}, "Повторный перенос"
+        assert retention.archive_path('2025-04').stat().st_size == size
+        logger.info("✅ Повторный запуск ничего не меняет")
+        manager.close_all()
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка: {e}", exc_info=True)
+        return False
+
+
+def main():
+    """Запускает все тесты"""
+    logger.info("=" * 60)
+    logger.info("🧪 ТЕСТ МИГРАЦИЙ И ПЛАНОВ ЗАПРОСОВ")
+    logger.info("=" * 60)
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        create_legacy_databases(data_dir)
+
+        results['User DB'] = test_user_db(data_dir)
+        results['FNSI DB'] = test_fnsi_db(data_dir)
+        results['Idempotent Migrations'] = test_migrations_idempotent(data_dir)
+        results['Activity Retention'] = test_activity_retention(data_dir)
+
+    # Выводим результаты
+    logger.info("\n" + "=" * 60)
+    logger.info("📊 РЕЗУЛЬТАТЫ ТЕСТОВ")
+    logger.info("=" * 60)
+
+    passed = sum(1 for v in results.values() if v)
+    total = len(results)
+
+    for test_name, success in results.items():
+        status = "✅" if success else "❌"
+        logger.info(f"{status} {test_name}")
+
+    logger.info(f"\n{passed}/{total} тестов пройдено")
+
+    if passed == total:
+        logger.info("\n✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ УСПЕШНО!")
+        logger.info("=" * 60)
+        return True
+    else:
+        logger.error("\n❌ Некоторые тесты не прошли!")
+        logger.error("=" * 60)
+        return False
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,306 @@
+"""
+Буферизованная запись активности пользователей.
+
+add_log только ставит событие в очередь и сразу возвращает управление
+обработчику сообщения. Фоновый поток записывает накопленные события одной
+транзакцией (executemany) каждые flush_interval или по набору batch_size
+событий; при остановке бота очередь дописывается полностью.
+
+В той же транзакции обновляется дневная сводка activity_daily, по которой
+строится статистика без чтения журнала.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import get_config
+from utils.database import get_user_db
+
+logger = logging.getLogger(__name__)
+
+cfg = get_config()
+
+# Предел очереди: если база недоступна, события сверх предела отбрасываются,
+# а не копятся в памяти
+_QUEUE_LIMIT = 10000
+# Сколько ждать записи очереди при остановке (сек)
+_STOP_TIMEOUT = 10.0
+# Повторы записи пакета (база заблокирована, нет места на диске):
+# задержка перед повтором удваивается
+_WRITE_RETRIES = 3
+_RETRY_DELAY = 0.5
+
+# Регистрация пользователя: повторная не меняет дату регистрации,
+# но обновляет имя пользователя
+UPSERT_USER_SQL = (
+    'INSERT INTO users'
+    '(id, username, first_name, last_name, reg_date)'
+    ' VALUES (?, ?, ?, ?, ?)'
+    ' ON CONFLICT(id) DO UPDATE SET'
+    ' username = excluded.username,'
+    ' first_name = excluded.first_name,'
+    ' last_name = excluded.last_name'
+)
+
+# Прибавление к дневной сводке активности (activity_daily)
+UPSERT_DAILY_SQL = (
+    'INSERT INTO activity_daily (day, activity, user_kind, events)'
+    ' VALUES (?, ?, ?, ?)'
+    ' ON CONFLICT(day, activity, user_kind) DO UPDATE SET'
+    ' events = events + excluded.events'
+)
+# Типы пользователей в сводке
+USER_KIND_ADMIN = 'admin'
+USER_KIND_USER = 'user'
+
+# (id, username, first_name, last_name, activity, date_time - секунды Unix)
+ActivityEvent = Tuple[int, Optional[str], Optional[str], Optional[str], str, int]
+
+
+class ActivityLogger:
+    """Очередь событий активности и поток их пакетной записи в user_data.sqlite"""
+
+    def __init__(self, flush_interval: float, batch_size: int, admin_ids: Iterable[int] = ()):
+        """
+        Args:
+            flush_interval: максимальная задержка записи события (сек)
+            batch_size: после стольких событий запись не ждёт flush_interval
+            admin_ids: события этих пользователей учитываются в сводке отдельно
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.admin_ids = frozenset(admin_ids)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=_QUEUE_LIMIT)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        # ID зарегистрированных пользователей: загружаются один раз при запуске
+        # потока записи, новые добавляются после записи в users
+        self._known_users: Set[int] = set()
+        self._known_lock = threading.Lock()
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+
+    def start(self):
+        """Запускает поток записи (если ещё не запущен)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._writer, name="activity-log", daemon=True
+                )
+                self._thread.start()
+
+    def mark_known(self, user_id: int):
+        """Запоминает, что пользователь уже есть в таблице users"""
+        with self._known_lock:
+            self._known_users.add(user_id)
+
+    def _load_known_users(self):
+        try:
+            rows = get_user_db().connection().execute('SELECT id FROM users').fetchall()
+        except Exception as e:
+            logger.warning(f'Warning: {e}')
+            return
+        with self._known_lock:
+            self._known_users.update(user_id for user_id, in rows)
+        logger.debug(f"Журнал активности: загружено {len(rows)} зарегистрированных пользователей")
+
+    def log(self, event: ActivityEvent):
+        """Ставит событие в очередь без ожидания"""
+        if self._stopped:
+            logger.warning(f"Журнал активности остановлен, событие не записано: {event[4]}")
+            return
+        self.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            dropped = self._count_dropped(1)
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Очередь журнала активности переполнена, отброшено событий: {dropped}")
+
+    def _count_dropped(self, count: int) -> int:
+        with self._dropped_lock:
+            self._dropped += count
+            return self._dropped
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Дожидается записи событий, поставленных в очередь до вызова.
+
+        Returns:
+            True если записано за timeout
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = _STOP_TIMEOUT):
+        """Записывает оставшиеся события и останавливает поток записи"""
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(
+                f"Журнал активности: не удалось записать очередь за {timeout:g} с, "
+                f"осталось событий: {self._queue.qsize()}"
+            )
+            return
+        try:
+            # Переносим WAL в основной файл: запись переживёт и сбой питания
+            get_user_db().connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            logger.warning(f'Warning: {e}')
+        logger.info(
+            f"Журнал активности остановлен: записано событий {self.written} "
+            f"за {self.batches} транзакций, отброшено {self._dropped}"
+        )
+
+    def _writer(self):
+        """Собирает пакет событий и записывает его одной транзакцией"""
+        self._load_known_users()
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch: List[ActivityEvent] = []
+            waiters: List[threading.Event] = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                # flush() и остановка не ждут окончания интервала
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if stop:
+                # Дописываем всё, что успели поставить в очередь перед остановкой
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not None:
+                        batch.append(item)
+
+            for start in range(0, len(batch), self.batch_size):
+                self._write(batch[start:start + self.batch_size])
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch: List[ActivityEvent]):
+        """
+        Записывает пакет, при ошибке повторяет с нарастающей задержкой.
+
+        Новые события тем временем копятся в очереди; пакет, который
+        не удалось записать и после повторов, учитывается как отброшенный.
+        """
+        error = None
+        for attempt in range(_WRITE_RETRIES + 1):
+            if attempt:
+                delay = _RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Журнал активности: не удалось записать {len(batch)} событий: {error}, "
+                    f"повтор через {delay:g} с"
+                )
+                time.sleep(delay)
+            try:
+                self._write_batch(batch)
+                return
+            except Exception as e:
+                error = e
+        self._count_dropped(len(batch))
+        logger.error(
+            f"Журнал активности: {len(batch)} событий не записано "
+            f"после {_WRITE_RETRIES + 1} попыток: {error}"
+        )
+
+    def _write_batch(self, batch: List[ActivityEvent]):
+        """Одна транзакция: новые пользователи, дневная сводка и события"""
+        # Новые пользователи регистрируются временем первого события
+        with self._known_lock:
+            users = {}
+            for user_id, username, first_name, last_name, _, date_time in batch:
+                if user_id not in self._known_users:
+                    users.setdefault(user_id, (
+                        user_id, username, first_name, last_name,
+                        datetime.fromtimestamp(date_time).isoformat()
+                    ))
+        # Сводка за день: одна строка на (день, активность, тип пользователя)
+        daily: Dict[Tuple[str, str, str], int] = {}
+        for user_id, _, _, _, activity, date_time in batch:
+            key = (
+                datetime.fromtimestamp(date_time).date().isoformat(),
+                activity or '',
+                USER_KIND_ADMIN if user_id in self.admin_ids else USER_KIND_USER,
+            )
+            daily[key] = daily.get(key, 0) + 1
+        with get_user_db().transaction() as conn:
+            if users:
+                conn.executemany(UPSERT_USER_SQL, users.values())
+            conn.executemany(UPSERT_DAILY_SQL, [(*key, events) for key, events in daily.items()])
+            conn.executemany(
+                'INSERT INTO users_activity'
+                '(id, activity, date_time) VALUES (?, ?, ?)',
+                [(event[0], event[4], event[5]) for event in batch]
+            )
+        with self._known_lock:
+            self._known_users.update(users)
+        self.written += len(batch)
+        self.batches += 1
+
+
+_activity_logger: Optional[ActivityLogger] = None
+_activity_logger_lock = threading.Lock()
+
+
+def get_activity_logger() -> ActivityLogger:
+    """Глобальный журнал активности"""
+    global _activity_logger
+    if _activity_logger is None:
+        with _activity_logger_lock:
+            if _activity_logger is None:
+                _activity_logger = ActivityLogger(
+                    flush_interval=cfg.database.activity_flush_ms / 1000,
+                    batch_size=cfg.database.activity_batch_size,
+                    admin_ids=cfg.accounts.admin_ids,
+                )
+    return _activity_logger
+
+
+def make_event(user_id: int, username: Optional[str], first_name: Optional[str],
+               last_name: Optional[str], activity: str) -> ActivityEvent:
+    """Событие активности с текущим временем"""
+    return (user_id, username, first_name, last_name, activity, int(time.time()))
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
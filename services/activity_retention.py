@@ -0,0 +1,182 @@
+"""
+Срок хранения журнала активности: перенос старых записей в архив
+и освобождение места в user_data.sqlite.
+
+Записи users_activity старше срока хранения переносятся в сжатые помесячные
+файлы users_activity_ГГГГ-ММ.csv.gz (месяц по местному времени), в базе
+остаётся только журнал за последние дни - он помещается в кеш страниц.
+Файл месяца дописывается: каждый перенос - отдельный блок gzip, заголовок
+CSV пишется при создании файла. Записи удаляются из базы после того, как
+файл записан на диск; при сбое между этими шагами они останутся в базе
+и попадут в архив повторно при следующем запуске.
+
+Дневная сводка activity_daily не затрагивается, статистика за любой
+период строится по ней. Освободившиеся страницы возвращаются файловой
+системе через PRAGMA incremental_vacuum небольшими шагами, чтобы не
+задерживать запись журнала.
+"""
+import csv
+import gzip
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config import get_config
+from utils.database import SQLiteConnectionManager, get_user_db
+
+logger = logging.getLogger(__name__)
+
+# Колонки архива (заголовок CSV)
+ARCHIVE_COLUMNS = ('id', 'activity', 'date_time')
+# Страниц, освобождаемых одной транзакцией incremental_vacuum
+_VACUUM_STEP_PAGES = 1024
+
+
+def _month_bounds(epoch: int) -> Tuple[str, int, int]:
+    """Месяц (ГГГГ-ММ) по местному времени и его границы в секундах Unix"""
+    start = datetime.fromtimestamp(epoch).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.strftime('%Y-%m'), int(start.timestamp()), int(end.timestamp())
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} МБ"
+
+
+class ActivityRetention:
+    """Перенос журнала активности в помесячные архивы и VACUUM базы"""
+
+    def __init__(self, retention_days: int, archive_dir: Optional[Path] = None,
+                 db: Optional[SQLiteConnectionManager] = None):
+        """
+        Args:
+            retention_days: сколько дней журнал хранится в базе (0 - не переносить)
+            archive_dir: каталог архивов (по умолчанию env/data/archive)
+            db: база журнала (по умолчанию user_data.sqlite)
+        """
+        self.retention_days = retention_days
+        self.archive_dir = Path(archive_dir or get_config().paths.data_dir / "archive")
+        self.db = db or get_user_db()
+
+    def archive_path(self, month: str) -> Path:
+        """Файл архива за месяц ГГГГ-ММ"""
+        return self.archive_dir / f"users_activity_{month}.csv.gz"
+
+    def cutoff(self, now: Optional[datetime] = None) -> int:
+        """Начало самого старого хранимого дня в секундах Unix"""
+        day = (now or datetime.now()) - timedelta(days=self.retention_days)
+        return int(day.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+    def archive(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Переносит записи старше срока хранения в архив, по одному месяцу.
+
+        Returns:
+            dict: месяц ГГГГ-ММ -> число перенесённых записей
+        """
+        if self.retention_days <= 0:
+            return {}
+        cutoff = self.cutoff(now)
+        con = self.db.connection()
+        moved: Dict[str, int] = {}
+        while True:
+            oldest = con.execute(
+                'SELECT min(date_time) FROM users_activity WHERE date_time < ?', (cutoff,)
+            ).fetchone()[0]
+            if oldest is None:
+                break
+            month, start, end = _month_bounds(oldest)
+            end = min(end, cutoff)
+
+            count = self._write_archive(con, month, start, end)
+            # Новые события пишутся с текущим временем и в период не попадают
+            with self.db.transaction() as conn:
+                conn.execute(
+                    'DELETE FROM users_activity WHERE date_time >= ? AND date_time < ?',
+                    (start, end)
+                )
+            moved[month] = moved.get(month, 0) + count
+            logger.info(f"Журнал активности: {count} записей за {month} перенесено в {self.archive_path(month).name}")
+        return moved
+
+    def _write_archive(self, con: sqlite3.Connection, month: str, start: int, end: int) -> int:
+        """Дописывает записи периода в архив месяца и сбрасывает файл на диск"""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_path(month)
+        new_file = not path.exists() or path.stat().st_size == 0
+        rows = con.execute(
+            'SELECT id, activity, date_time FROM users_activity'
+            ' WHERE date_time >= ? AND date_time < ? ORDER BY date_time',
+            (start, end)
+        )
+        count = 0
+        with open(path, 'ab') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8', newline='') as archive:
+                writer = csv.writer(archive)
+                if new_file:
+                    writer.writerow(ARCHIVE_COLUMNS)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        return count
+
+    def vacuum(self) -> Dict[str, int]:
+        """
+        Возвращает свободные страницы базы файловой системе.
+
+        База переводится в auto_vacuum=INCREMENTAL при первом соединении
+        (SQLiteConnectionManager с incremental_vacuum=True); полный VACUUM,
+        который надолго блокирует запись журнала, здесь не выполняется.
+
+        Returns:
+            dict: size_before, size_after, reclaimed (байт)
+        """
+        con = self.db.connection()
+        page_size = con.execute('PRAGMA page_size').fetchone()[0]
+        size_before = con.execute('PRAGMA page_count').fetchone()[0] * page_size
+
+        free = con.execute('PRAGMA freelist_count').fetchone()[0]
+        while free:
+            # execute() выполняет только первый шаг прагмы (одну страницу),
+            # executescript() - до конца
+            con.executescript(f'PRAGMA incremental_vacuum({_VACUUM_STEP_PAGES})')
+            left = con.execute('PRAGMA freelist_count').fetchone()[0]
+            if left >= free:
+                # Без auto_vacuum=INCREMENTAL прагма ничего не освобождает
+                logger.warning(f"{self.db.path.name}: свободные страницы не освобождены ({free})")
+                break
+            free = left
+
+        # Размер файла уменьшается при переносе WAL в основной файл
+        con.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        size_after = con.execute('PRAGMA page_count').fetchone()[0] * page_size
+        return {
+            'size_before': size_before,
+            'size_after': size_after,
+            'reclaimed': size_before - size_after,
+        }
+
+    def run(self, now: Optional[datetime] = None) -> dict:
+        """Перенос журнала в архив и VACUUM; итог пишется в лог"""
+        moved = self.archive(now)
+        sizes = self.vacuum()
+        rows = self.db.connection().execute('SELECT count(*) FROM users_activity').fetchone()[0]
+        logger.info(
+            f"Обслуживание {self.db.path.name}: в архив перенесено {sum(moved.values())} записей"
+            f" ({', '.join(moved) or 'нет'}), освобождено {_mb(sizes['reclaimed'])},"
+            f" размер {_mb(sizes['size_after'])}, в журнале {rows} записей"
+        )
+        return {'archived': moved, 'rows': rows, **sizes}
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
@@ -3,8 +3,15 @@ Database service - shared database operations for all plugins
 """
 import sqlite3
 from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
 from telebot import types
-from utils.database import create_table_nsi_passport
+from services.activity_log import (
+    UPSERT_USER_SQL,
+    USER_KIND_USER,
+    get_activity_logger,
+    make_event,
+)
+from utils.database import get_fnsi_db, get_user_db
 from config import get_config
 
 import logging
@@ -15,83 +22,94 @@ cfg = get_config()
 
 
 def add_user(id, username, first_name, last_name):
-    """Register a new user in the database"""
-    conn = sqlite3.connect(cfg.paths.user_db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        'CREATE TABLE IF NOT EXISTS users ('
-        'id INTEGER PRIMARY KEY,'
-        'username TEXT,'
-        'first_name TEXT,'
-        'last_name TEXT,'
-        'reg_date TEXT'
-        ')'
-    )
+    """Register a user in the database (idempotent: an existing user keeps reg_date)"""
     try:
-        cursor.execute(
-            'INSERT INTO users'
-            '(id, username, first_name, last_name, reg_date)'
-            ' VALUES (?, ?, ?, ?, ?)',
-            (id, username, first_name, last_name, datetime.now().isoformat())
-        )
-        conn.commit()
+        with get_user_db().transaction() as conn:
+            conn.execute(
+                UPSERT_USER_SQL,
+                (id, username, first_name, last_name, datetime.now().isoformat())
+            )
+        get_activity_logger().mark_known(id)
     except Exception as e:
         logger.warning(f'Warning: {e}')
-        conn.commit()
-        conn.close()
 
 
 def add_log(message):
-    """Log user activity"""
-    conn = sqlite3.connect(cfg.paths.user_db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        'CREATE TABLE IF NOT EXISTS users_activity'
-        ' (id INTEGER, activity TEXT, date_time TEXT)'
-    )
-    cursor.execute('SELECT id FROM users WHERE id = ?', (message.from_user.id,))
-    if cursor.fetchone() is None:
-        add_user(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            message.from_user.last_name
-        )
+    """Log user activity (written in background, see services.activity_log)"""
+    if isinstance(message, types.CallbackQuery):
+        log_text = message.data
+    elif isinstance(message, types.Message):
+        log_text = message.text
+    else:
+        log_text = 'unknown type'
+    get_activity_logger().log(make_event(
+        message.from_user.id,
+        message.from_user.username,
+        message.from_user.first_name,
+        message.from_user.last_name,
+        log_text
+    ))
+
+
+def _to_epoch(value) -> int:
+    """date (start of day), datetime or ISO string -> Unix seconds"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return int(value.timestamp())
+
+
+def get_activity(start_date, stop_date):
+    """
+    Get user activity logs within date range.
+
+    Args:
+        start_date: start of the range (date, datetime or ISO string), inclusive
+        stop_date: end of the range, exclusive
+
+    Returns:
+        list of (id, activity, date_time ISO string) or None on error
+
+    Events logged within the last ACTIVITY_FLUSH_MS may not be written yet.
+    """
     try:
-        if isinstance(message, types.CallbackQuery):
-            log_text = message.data
-        elif isinstance(message, types.Message):
-            log_text = message.text
-        else:
-            log_text = 'unknown type'
-        cursor.execute(
-            'INSERT INTO users_activity'
-            '(id, activity, date_time) VALUES (?, ?, ?)',
-            (message.from_user.id, log_text, datetime.now().isoformat())
-        )
-        conn.commit()
-        conn.close()
+        rows = get_user_db().connection().execute(
+            'SELECT id, activity, date_time FROM users_activity'
+            ' WHERE date_time >= ? AND date_time < ? ORDER BY date_time',
+            (_to_epoch(start_date), _to_epoch(stop_date))
+        ).fetchall()
     except Exception as e:
         logger.warning(f'Warning: {e}')
-        conn.commit()
-        conn.close()
+        return None
+    return [
+        (user_id, activity, datetime.fromtimestamp(date_time).isoformat())
+        for user_id, activity, date_time in rows
+    ]
 
 
-def get_activity(start_date='', stop_date=''):
-    """Get user activity logs within date range"""
-    conn = sqlite3.connect(cfg.paths.user_db_path)
-    cursor = conn.cursor()
+def get_activity_daily(start_date, stop_date, user_kind: str = USER_KIND_USER) -> List[tuple]:
+    """
+    Get daily activity counts (activity_daily rollup) within date range.
+
+    Args:
+        start_date: first day (date or ISO string), inclusive
+        stop_date: last day, exclusive
+        user_kind: 'user' or 'admin'
+
+    Returns:
+        list of (day ISO string, activity, events) or None on error
+
+    Events logged within the last ACTIVITY_FLUSH_MS may not be written yet.
+    """
     try:
-        cursor.execute(
-            'SELECT * FROM users_activity WHERE date_time BETWEEN ? AND ?',
-            (start_date, stop_date)
-        )
-        res = cursor.fetchall()
-        conn.close()
-        return res
+        return get_user_db().connection().execute(
+            'SELECT day, activity, events FROM activity_daily'
+            ' WHERE day >= ? AND day < ? AND user_kind = ?',
+            (str(start_date), str(stop_date), user_kind)
+        ).fetchall()
     except Exception as e:
         logger.warning(f'Warning: {e}')
-        conn.close()
         return None
 
 
@@ -107,39 +125,142 @@ def add_nsi_passport(to_db: dict) -> bool:
     Returns:
         bool: True if changes were made, False otherwise
     """
-    res = False
-    con = sqlite3.connect(cfg.paths.fnsi_db_path)
-    cur = con.cursor()
-
-    # Check if table exists, create if it doesn't
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='nsi_passport'")
-    table_exists = cur.fetchone()
-    if not table_exists:
-        create_table_nsi_passport()
-
-    # Check if record already exists
-    cur.execute(
-        "SELECT * FROM nsi_passport WHERE (ID = ? AND version = ?)",
-        [to_db['id'], to_db['version']]
-    )
-    row = cur.fetchone()
-
-    # If not found, add the record
-    if row is None:
+    return bool(add_nsi_passports([to_db]))
+
+
+def add_nsi_passports(passports: List[dict]) -> List[dict]:
+    """
+    Add NSI passports to database in one transaction.
+
+    Versions already stored are skipped (UNIQUE(ID, version)).
+
+    Args:
+        passports: dicts with keys id, fullName, shortName, lastUpdate,
+            version, releaseNotes (as returned by fnsi_client.get_version)
+
+    Returns:
+        List[dict]: passports that were actually added
+    """
+    if not passports:
+        return []
+    added = []
+    try:
+        with get_fnsi_db().transaction() as con:
+            add_date = datetime.now().isoformat()
+            for passport in passports:
+                cur = con.execute(
+                    "INSERT OR IGNORE INTO nsi_passport"
+                    "(ID, Name, ShortName, lastUpdate, "
+                    "version, releaseNotes, add_date) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    [
+                        passport['id'], passport['fullName'], passport['shortName'],
+                        passport['lastUpdate'], passport['version'],
+                        passport['releaseNotes'], add_date
+                    ]
+                )
+                if cur.rowcount == 1:
+                    added.append(passport)
+    except Exception as e:
+        logger.warning(f'Warning: {e}')
+        return []
+    return added
+
+
+def get_latest_nsi_versions(oids: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """
+    Get the latest stored version of NSI dictionaries in one query.
+
+    Args:
+        oids: dictionaries to read, None for all
+
+    Returns:
+        Dict[str, str]: OID -> version with the latest lastUpdate
+    """
+    # SQLite takes the bare column (version) from the row with max(lastUpdate)
+    query = "SELECT ID, version, max(lastUpdate) FROM nsi_passport"
+    params: List[str] = []
+    if oids is not None:
+        params = list(oids)
+        if not params:
+            return {}
+        query += f" WHERE ID IN ({', '.join('?' * len(params))})"
+    query += " GROUP BY ID"
+    try:
+        rows = get_fnsi_db().connection().execute(query, params).fetchall()
+    except sqlite3.OperationalError as e:
+        logger.warning(f'Warning: {e}')
+        return {}
+    return {oid: version for oid, version, _ in rows}
+
+
+def get_nsi_update_history() -> Dict[str, List[datetime]]:
+    """
+    Get publish dates (lastUpdate) of all stored NSI versions.
+
+    Returns:
+        Dict[str, List[datetime]]: OID -> publish dates in ascending order
+    """
+    try:
+        rows = get_fnsi_db().connection().execute(
+            "SELECT ID, lastUpdate FROM nsi_passport ORDER BY ID, lastUpdate"
+        ).fetchall()
+    except sqlite3.OperationalError as e:
+        # Table is not created yet
+        logger.warning(f'Warning: {e}')
+        return {}
+
+    history: Dict[str, List[datetime]] = {}
+    for oid, last_update in rows:
         try:
-            now = datetime.now().isoformat()
-            to_db['add_date'] = now
-            cur.execute(
-                "INSERT INTO nsi_passport"
-                "(ID, Name, ShortName, lastUpdate, "
-                "version, releaseNotes, add_date) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?);",
-                list(to_db.values())
+            history.setdefault(oid, []).append(datetime.fromisoformat(last_update))
+        except (TypeError, ValueError):
+            continue
+    return history
+
+
+# Колонки таблицы scheduler_state
+SCHEDULER_STATE_COLUMNS = (
+    'task_id', 'schedule', 'last_occurrence', 'last_started', 'last_status',
+    'last_success', 'last_duration', 'last_error', 'next_run', 'runs'
+)
+
+
+def get_scheduler_state() -> Dict[str, Dict[str, Any]]:
+    """
+    Get persisted state of scheduler tasks.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: task_id -> {column: value}
+    """
+    try:
+        rows = get_user_db().connection().execute(
+            f"SELECT {', '.join(SCHEDULER_STATE_COLUMNS)} FROM scheduler_state ORDER BY task_id"
+        ).fetchall()
+    except Exception as e:
+        logger.warning(f'Warning: {e}')
+        return {}
+    return {row[0]: dict(zip(SCHEDULER_STATE_COLUMNS, row)) for row in rows}
+
+
+def save_scheduler_state(state: Dict[str, Any]) -> bool:
+    """
+    Save state of a scheduler task (insert or replace by task_id).
+
+    Args:
+        state: {column: value}, must contain task_id
+
+    Returns:
+        bool: True if saved
+    """
+    try:
+        with get_user_db().transaction() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO scheduler_state ({', '.join(SCHEDULER_STATE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(SCHEDULER_STATE_COLUMNS))})",
+                [state.get(column) for column in SCHEDULER_STATE_COLUMNS]
             )
-            res = True
-            con.commit()
-            con.close()
-        except Exception as e:
-            logger.warning(f'Warning: {e}')
-            con.close()
-    return res
+        return True
+    except Exception as e:
+        logger.warning(f'Warning: {e}')
+        return False
@@ -0,0 +1,101 @@
+"""
+Реестр справочников - общее для процесса хранилище разобранных справочников НСИ.
+
+Хранит один неизменяемый снимок на (OID, версия): все плагины, работающие
+с одной версией справочника, используют одну разобранную копию, а не
+загружают свою.
+"""
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DictionaryRegistry:
+    """
+    Реестр разобранных снимков справочников по ключу (OID, версия).
+
+    Снимки только читаются. Загрузка выполняется один раз на ключ:
+    одновременные запросы той же версии ждут первого загрузчика, а не
+    разбирают архив повторно. При регистрации новой версии справочника
+    снимки других его версий освобождаются.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[Tuple[str, str], Any] = {}
+        self._load_locks: Dict[Tuple[str, str], Lock] = {}
+        self._lock = Lock()
+
+    def get(self, oid: str, version: str) -> Optional[Any]:
+        """
+        Загруженный снимок.
+
+        Args:
+            oid: OID справочника
+            version: версия справочника
+
+        Returns:
+            Снимок или None, если эта версия не загружена
+        """
+        with self._lock:
+            return self._snapshots.get((oid, version))
+
+    def get_or_load(
+        self, oid: str, version: str, loader: Callable[[], Optional[Any]]
+    ) -> Optional[Any]:
+        """
+        Снимок; если он ещё не зарегистрирован, загружается через loader().
+
+        Args:
+            oid: OID справочника
+            version: версия справочника
+            loader: строит снимок, при ошибке возвращает None
+
+        Returns:
+            Снимок или None, если загрузить не удалось
+        """
+        key = (oid, version)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                return snapshot
+            load_lock = self._load_locks.setdefault(key, Lock())
+
+        with load_lock:
+            # Другой поток мог загрузить снимок, пока мы ждали
+            snapshot = self.get(oid, version)
+            if snapshot is not None:
+                return snapshot
+
+            snapshot = loader()
+
+            with self._lock:
+                self._load_locks.pop(key, None)
+                if snapshot is None:
+                    return None
+                stale = [k for k in self._snapshots if k[0] == oid and k != key]
+                for stale_key in stale:
+                    del self._snapshots[stale_key]
+                self._snapshots[key] = snapshot
+
+            if stale:
+                logger.info(
+                    f"Справочник {oid}: версия {version} загружена, "
+                    f"освобождены версии {', '.join(k[1] for k in stale)}"
+                )
+            return snapshot
+
+
+# Глобальный экземпляр реестра
+_registry = DictionaryRegistry()
+
+
+def get_dictionary_registry() -> DictionaryRegistry:
+    """Возвращает общий реестр справочников"""
+    return _registry
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
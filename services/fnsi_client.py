@@ -2,14 +2,17 @@
 import logging
 import random
 from datetime import datetime
-from time import sleep
-from typing import Dict, Optional, Tuple
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Optional, Tuple
 
 import requests
 
 from config import get_config
-from plugins.semd_checker.semd_logic import SEMDVersionFetcher
-from services.database_service import add_nsi_passport
+from services.database_service import add_nsi_passports, get_latest_nsi_versions
+from services.fnsi_http import get_fnsi_http
+from services.nsi_diff import get_diff_summary
+from services.nsi_mirror import get_nsi_mirror
 from services.proxy_utils import build_proxies, build_url
 
 logger = logging.getLogger(__name__)
@@ -18,6 +21,40 @@ logger = logging.getLogger(__name__)
 _DEFAULT_FNSI_REQUEST_TIMEOUT = 60  # секунд на одну попытку
 _DEFAULT_FNSI_MAX_RETRIES = 3
 _DEFAULT_FNSI_RETRY_DELAY = 2  # базовая задержка между попытками
+# Меньше этого (сек) до deadline новую попытку не начинаем
+_MIN_ATTEMPT_TIMEOUT = 1.0
+
+
+# Подписчики на результаты отдельных попыток запроса к ФНСИ:
+# callback(latency_seconds, ok). ok=False - таймаут, ошибка соединения или 5xx,
+# т.е. признаки перегрузки ФНСИ.
+_request_listeners: List[Callable[[float, bool], None]] = []
+_listeners_lock = Lock()
+
+
+def add_request_listener(listener: Callable[[float, bool], None]):
+    """Подписывает listener на результаты попыток запроса к ФНСИ"""
+    with _listeners_lock:
+        _request_listeners.append(listener)
+
+
+def remove_request_listener(listener: Callable[[float, bool], None]):
+    """Отписывает listener от результатов попыток запроса к ФНСИ"""
+    with _listeners_lock:
+        if listener in _request_listeners:
+            _request_listeners.remove(listener)
+
+
+def _report_attempt(started: float, ok: bool):
+    """Сообщает подписчикам длительность и исход попытки запроса"""
+    latency = monotonic() - started
+    with _listeners_lock:
+        listeners = list(_request_listeners)
+    for listener in listeners:
+        try:
+            listener(latency, ok)
+        except Exception as e:
+            logger.warning(f"Ошибка обработчика результата запроса к ФНСИ: {e}")
 
 
 def _backoff_delay(attempt: int) -> float:
@@ -27,13 +64,23 @@ def _backoff_delay(attempt: int) -> float:
     return min(base, 30) + random.uniform(0, 1)
 
 
-def get_version(nsi: str, ver: str = "latest") -> dict:
+def _sleep_before_retry(attempt: int, deadline: Optional[float]):
+    """Пауза перед повторной попыткой, не дольше оставшегося до deadline времени"""
+    delay = _backoff_delay(attempt)
+    if deadline is not None:
+        delay = min(delay, max(0.0, deadline - monotonic()))
+    sleep(delay)
+
+
+def get_version(nsi: str, ver: str = "latest", deadline: Optional[float] = None) -> dict:
     """
     Получает информацию о справочниках с официального сайта ФНСИ.
 
     Args:
         nsi: OID справочника
         ver: версия (по умолчанию 'latest')
+        deadline: крайний срок (time.monotonic()), после которого новые
+            попытки не выполняются, а таймаут попытки ограничен остатком
 
     Returns:
         dict: информация о справочнике
@@ -64,7 +111,7 @@ def get_version(nsi: str, ver: str = "latest") -> dict:
         "Accept": "application/json;charset=UTF-8",
         "Content-Type": "application/json",
     }
-    session = requests.Session()
+    session = get_fnsi_http().session()
     url = (
         f"{build_url(cfg.apis.fnsi_api_url, 'searchDictionary')}"
         f"?userKey={cfg.apis.fnsi_api_key}&identifier={nsi}"
@@ -75,25 +122,39 @@ def get_version(nsi: str, ver: str = "latest") -> dict:
 
     last_error = None
     for attempt in range(1, max_retries + 1):
+        attempt_timeout = request_timeout
+        if deadline is not None:
+            remaining = deadline - monotonic()
+            if remaining < _MIN_ATTEMPT_TIMEOUT:
+                error_msg = (
+                    f"Истёк срок цикла проверки, запрос к ФНСИ для справочника {nsi} "
+                    f"прерван (попытка {attempt}/{max_retries})"
+                )
+                logger.warning(error_msg)
+                raise ConnectionError(error_msg)
+            attempt_timeout = min(request_timeout, remaining)
+
+        started = monotonic()
         try:
             response = session.get(
                 url,
                 headers=headers,
-                verify=str(cfg.paths.mzrf_cert_path),
-                timeout=request_timeout,
+                timeout=attempt_timeout,
                 proxies=proxies,
             )
             response.raise_for_status()
+            _report_attempt(started, ok=True)
             logger.debug(f"Успешно получен ответ от ФНСИ для справочника {nsi}")
             break
 
         except requests.exceptions.Timeout as e:
+            _report_attempt(started, ok=False)
             last_error = e
             logger.warning(
                 f"Таймаут запроса к ФНСИ для справочника {nsi} (попытка {attempt}/{max_retries})"
             )
             if attempt < max_retries:
-                sleep(_backoff_delay(attempt))
+                _sleep_before_retry(attempt, deadline)
 
         except requests.exceptions.SSLError as e:
             error_msg = f"SSL ошибка при запросе к ФНСИ для справочника {nsi}: {e}"
@@ -101,22 +162,25 @@ def get_version(nsi: str, ver: str = "latest") -> dict:
             raise ConnectionError(error_msg)
 
         except requests.exceptions.ConnectionError as e:
+            _report_attempt(started, ok=False)
             last_error = e
             logger.warning(
                 f"Ошибка соединения с ФНСИ для справочника {nsi} (попытка {attempt}/{max_retries}): {e}"
             )
             if attempt < max_retries:
-                sleep(_backoff_delay(attempt))
+                _sleep_before_retry(attempt, deadline)
 
         except requests.exceptions.HTTPError as e:
             # 5xx ошибки ФНСИ часто временные — пробуем ещё раз
             status_code = e.response.status_code if e.response is not None else 0
+            # 4xx - ФНСИ ответил, это не признак перегрузки
+            _report_attempt(started, ok=not 500 <= status_code < 600)
             last_error = e
             if 500 <= status_code < 600 and attempt < max_retries:
                 logger.warning(
                     f"HTTP {status_code} от ФНСИ для справочника {nsi} (попытка {attempt}/{max_retries})"
                 )
-                sleep(_backoff_delay(attempt))
+                _sleep_before_retry(attempt, deadline)
             else:
                 error_msg = f"Ошибка запроса к ФНСИ для {nsi}: {e}"
                 logger.error(error_msg)
@@ -207,65 +271,97 @@ def get_version(nsi: str, ver: str = "latest") -> dict:
     return fnsi_info
 
 
-def nsi_passport_updater(fnsi_oid: str, vers: str = "latest") -> Tuple[bool, dict]:
+def check_nsi_version(
+    fnsi_oid: str,
+    current_version: Optional[str],
+    vers: str = "latest",
+    deadline: Optional[float] = None,
+) -> Optional[dict]:
     """
-    Обновляет паспорт справочника ФНСИ.
+    Сравнивает версию справочника в ФНСИ с известной версией из базы.
+
+    При выходе новой версии ставит её загрузку в локальное зеркало
+    в фоновую очередь (NSIMirror.ensure) и сразу возвращает паспорт;
+    паспорт версии в базу не записывает - это делает вызывающий
+    (add_nsi_passports).
 
     Args:
         fnsi_oid: OID справочника
+        current_version: последняя версия из базы или None, если её нет
         vers: версия для проверки
+        deadline: крайний срок запроса к ФНСИ (time.monotonic())
 
     Returns:
-        Tuple[bool, dict]:
-            - bool: обновлен ли справочник
-            - dict: информация о справочнике (если обновлен) или None (если нет/ошибка)
+        dict: информация о новой версии или None (если обновления нет/ошибка)
     """
     try:
-        # Получаем информацию о текущей версии из базы
-        fnsi = SEMDVersionFetcher(fnsi_oid)
-
-        # Проверяем, что объект fnsi не None
-        if fnsi is None:
-            logger.warning(
-                f"Не удалось получить информацию о справочнике {fnsi_oid} из базы"
-            )
-            return False, None
-
         # Получаем актуальную информацию с ФНСИ
-        fnsi_info = get_version(fnsi_oid, vers)
+        fnsi_info = get_version(fnsi_oid, vers, deadline)
 
         # Проверяем, что fnsi_info не None и содержит необходимые поля
         if not fnsi_info or "version" not in fnsi_info:
             logger.warning(f"Невалидная информация от ФНСИ для справочника {fnsi_oid}")
-            return False, None
+            return None
 
         # Проверяем, есть ли обновление
-        current_version = getattr(fnsi, "latest", None)
-        if current_version != fnsi_info["version"]:
-            # Пытаемся добавить новую версию в базу
-            success = add_nsi_passport(fnsi_info)
-            if success:
-                logger.info(
-                    f"Успешно обновлен справочник {fnsi_oid} до версии {fnsi_info['version']}"
-                )
-                return True, fnsi_info
-            else:
-                logger.error(f"Не удалось добавить справочник {fnsi_oid} в базу данных")
-                return False, None
-        else:
+        if current_version == fnsi_info["version"]:
             logger.debug(f"Обновлений для справочника {fnsi_oid} не найдено")
-            return False, None
+            # Справочника ещё нет в зеркале - загружаем в фоне
+            get_nsi_mirror().ensure(fnsi_oid, current_version)
+            return None
+
+        logger.info(
+            f"Найдена новая версия справочника {fnsi_oid}: {fnsi_info['version']}"
+        )
+        get_nsi_mirror().ensure(fnsi_oid, fnsi_info["version"])
+        return fnsi_info
 
     except (ConnectionError, ValueError) as e:
         logger.error(f"Ошибка при обновлении справочника {fnsi_oid}: {e}")
         logger.debug(f"Детали ошибки для {fnsi_oid}: {str(e)}")
-        return False, None
+        return None
 
     except Exception as e:
         logger.error(f"Неожиданная ошибка при обновлении справочника {fnsi_oid}: {e}")
         logger.exception(f"Детали исключения для {fnsi_oid}")
+        return None
+
+
+def nsi_passport_updater(
+    fnsi_oid: str, vers: str = "latest", deadline: Optional[float] = None
+) -> Tuple[bool, dict]:
+    """
+    Обновляет паспорт справочника ФНСИ.
+
+    Для проверки многих справочников за раз выгоднее прочитать известные
+    версии одним запросом (get_latest_nsi_versions), а новые записать
+    одной транзакцией (add_nsi_passports).
+
+    Args:
+        fnsi_oid: OID справочника
+        vers: версия для проверки
+        deadline: крайний срок запроса к ФНСИ (time.monotonic())
+
+    Returns:
+        Tuple[bool, dict]:
+            - bool: обновлен ли справочник
+            - dict: информация о справочнике (если обновлен) или None (если нет/ошибка)
+    """
+    # Получаем информацию о текущей версии из базы
+    current_version = get_latest_nsi_versions([fnsi_oid]).get(fnsi_oid)
+    fnsi_info = check_nsi_version(fnsi_oid, current_version, vers, deadline)
+    if fnsi_info is None:
         return False, None
 
+    # Пытаемся добавить новую версию в базу
+    if add_nsi_passports([fnsi_info]):
+        logger.info(
+            f"Успешно обновлен справочник {fnsi_oid} до версии {fnsi_info['version']}"
+        )
+        return True, fnsi_info
+    logger.error(f"Не удалось добавить справочник {fnsi_oid} в базу данных")
+    return False, None
+
 
 if __name__ == "__main__":
     logger.warning("This module is not for direct call")
@@ -0,0 +1,124 @@
+"""
+Общий HTTP-клиент для запросов к ФНСИ.
+
+Один requests.Session на процесс: пул keep-alive соединений размером по
+числу потоков проверки и SSL-контекст, собранный из сертификата Минздрава
+один раз, а не при каждом запросе. Используется и API паспортов
+справочников, и скачиванием архивов.
+"""
+import logging
+import ssl
+from threading import Lock
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Дополнительные соединения сверх потоков проверки: фоновые загрузки
+# зеркала справочников и перезагрузка СЭМД 1520
+_EXTRA_CONNECTIONS = 2
+
+
+class _FNSIAdapter(HTTPAdapter):
+    """HTTPAdapter с заранее собранным SSL-контекстом"""
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs):
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs["ssl_context"] = self._ssl_context
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+class FNSIHttpClient:
+    """
+    Общая сессия ФНСИ.
+
+    Сессия пересоздаётся, только если файл сертификата изменился
+    (например, после scripts/fetch_fnsi_cert.py).
+    """
+
+    def __init__(self, pool_size: Optional[int] = None):
+        cfg = get_config()
+        self.pool_size = pool_size or cfg.apis.fnsi_max_workers + _EXTRA_CONNECTIONS
+        self._session: Optional[requests.Session] = None
+        self._cert_mtime: Optional[float] = None
+        self._lock = Lock()
+
+    def _build_session(self, cert_path) -> requests.Session:
+        ssl_context = ssl.create_default_context(cafile=str(cert_path))
+        adapter = _FNSIAdapter(
+            ssl_context,
+            pool_connections=2,  # API и сервер файлов
+            pool_maxsize=self.pool_size,
+            pool_block=False,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", HTTPAdapter(pool_maxsize=self.pool_size))
+        session.headers.update({"Connection": "keep-alive"})
+        logger.info(
+            f"Создана сессия ФНСИ: пул {self.pool_size} соединений, "
+            f"сертификат {cert_path.name}"
+        )
+        return session
+
+    def session(self) -> requests.Session:
+        """
+        Возвращает общую сессию.
+
+        Raises:
+            ConnectionError: сертификат Минздрава не найден
+        """
+        cert_path = get_config().paths.mzrf_cert_path
+        try:
+            cert_mtime = cert_path.stat().st_mtime
+        except OSError:
+            raise ConnectionError(
+                f"Сертификат Минздрава не найден: {cert_path}. "
+                f"Выполните poetry run python scripts/fetch_fnsi_cert.py"
+            )
+
+        with self._lock:
+            if self._session is None or self._cert_mtime != cert_mtime:
+                if self._session is not None:
+                    logger.info("Сертификат Минздрава обновлён, пересоздаём сессию ФНСИ")
+                    self._session.close()
+                self._session = self._build_session(cert_path)
+                self._cert_mtime = cert_mtime
+            return self._session
+
+    def close(self):
+        """Закрывает соединения пула"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+# Глобальный экземпляр клиента
+_client: Optional[FNSIHttpClient] = None
+_client_lock = Lock()
+
+
+def get_fnsi_http() -> FNSIHttpClient:
+    """Возвращает общий HTTP-клиент ФНСИ"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = FNSIHttpClient()
+        return _client
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
@@ -0,0 +1,157 @@
+"""
+Построчное сравнение версий справочников НСИ.
+
+Сравнивает предыдущую и новую версии справочника из локального зеркала
+по первичному ключу и хэшу содержимого строки за линейное время и
+сохраняет сводку (число добавленных, удалённых и изменённых строк)
+в fnsi_data.sqlite, чтобы изменения вычислялись один раз на версию,
+а не каждым потребителем.
+"""
+import hashlib
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from utils.database import get_fnsi_db
+
+logger = logging.getLogger(__name__)
+
+# Разделитель значений при хэшировании строки (не встречается в CSV)
+_FIELD_SEPARATOR = "\x1f"
+
+
+@dataclass
+class DictionaryDiff:
+    """Изменения между двумя версиями справочника"""
+
+    oid: str
+    from_version: str
+    to_version: str
+    key_column: str
+    # Ключи добавленных, удалённых и изменённых строк
+    added: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+    changed: Set[str] = field(default_factory=set)
+
+    def summary(self) -> dict:
+        """Краткая сводка: количество добавленных/удалённых/изменённых строк"""
+        return {
+            "from_version": self.from_version,
+            "to_version": self.to_version,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+        }
+
+
+def _row_hash(values: Tuple[str, ...]) -> bytes:
+    """Хэш содержимого строки"""
+    return hashlib.blake2b(
+        _FIELD_SEPARATOR.join(values).encode("utf-8"), digest_size=16
+    ).digest()
+
+
+def _aligned_rows(table, columns: Tuple[str, ...]) -> Dict[str, Tuple[str, ...]]:
+    """Строки таблицы в заданном порядке колонок (отсутствующие - пустые)"""
+    if table.columns == columns:
+        return table.rows
+    positions = [
+        table.columns.index(column) if column in table.columns else None
+        for column in columns
+    ]
+    return {
+        key: tuple(row[pos] if pos is not None else "" for pos in positions)
+        for key, row in table.rows.items()
+    }
+
+
+def diff_tables(old, new) -> DictionaryDiff:
+    """
+    Сравнивает две версии справочника.
+
+    Строки сопоставляются по ключу, изменения определяются по хэшу
+    содержимого. Время работы линейно по размеру справочников.
+
+    Args:
+        old: MirrorTable предыдущей версии
+        new: MirrorTable новой версии
+
+    Returns:
+        DictionaryDiff
+    """
+    # При изменении состава колонок сравниваем по их объединению
+    columns = new.columns + tuple(c for c in old.columns if c not in new.columns)
+    old_rows = _aligned_rows(old, columns)
+    new_rows = _aligned_rows(new, columns)
+
+    diff = DictionaryDiff(new.oid, old.version, new.version, new.key_column)
+    old_hashes = {key: _row_hash(row) for key, row in old_rows.items()}
+
+    for key, row in new_rows.items():
+        old_hash = old_hashes.pop(key, None)
+        if old_hash is None:
+            diff.added.add(key)
+        elif old_hash != _row_hash(row):
+            diff.changed.add(key)
+    # Ключи, не встретившиеся в новой версии, удалены
+    diff.removed.update(old_hashes)
+
+    return diff
+
+
+def save_diff(diff: DictionaryDiff) -> bool:
+    """
+    Сохраняет сводку сравнения в базу.
+
+    Returns:
+        True если сохранено успешно
+    """
+    try:
+        with get_fnsi_db().transaction() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO nsi_diff_summary"
+                "(ID, from_version, to_version, added, removed, changed, add_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    diff.oid,
+                    diff.from_version,
+                    diff.to_version,
+                    len(diff.added),
+                    len(diff.removed),
+                    len(diff.changed),
+                    datetime.now().isoformat(),
+                ],
+            )
+        return True
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить изменения справочника {diff.oid}: {e}")
+        return False
+
+
+def get_diff_summary(oid: str, version: str) -> Optional[dict]:
+    """
+    Сводка изменений версии справочника относительно предыдущей.
+
+    Returns:
+        dict с ключами from_version, to_version, added, removed, changed
+        или None, если сравнение не выполнялось
+    """
+    try:
+        row = get_fnsi_db().connection().execute(
+            "SELECT from_version, to_version, added, removed, changed "
+            "FROM nsi_diff_summary WHERE ID = ? AND to_version = ?",
+            [oid, version],
+        ).fetchone()
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Warning: {e}")
+        return None
+    if row is None:
+        return None
+    return dict(zip(("from_version", "to_version", "added", "removed", "changed"), row))
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
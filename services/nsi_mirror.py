@@ -0,0 +1,375 @@
+"""
+Локальное зеркало справочников НСИ.
+
+Хранит разобранную копию текущей версии каждого отслеживаемого справочника
+в компактном индексированном виде (строки по первичному ключу),
+чтобы искать коды локально, не обращаясь к ФНСИ на каждый запрос.
+Обновляется только при появлении новой версии справочника.
+"""
+import csv
+import io
+import logging
+import os
+import pickle
+import queue
+import time
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import get_config
+from services.dictionary_registry import get_dictionary_registry
+from services.nsi_diff import diff_tables, get_diff_summary, save_diff
+from utils.file_utils import download_file
+
+logger = logging.getLogger(__name__)
+
+# Колонки-кандидаты на роль первичного ключа (в порядке приоритета)
+_KEY_COLUMNS = ("ID", "RECID", "CODE", "OID")
+# Префикс ключей зеркала в общем реестре справочников
+_REGISTRY_PREFIX = "mirror:"
+
+# Предельное время скачивания архива справочника целиком (сек)
+_DOWNLOAD_TIMEOUT = 10 * 60
+
+# Вызывается после загрузки версии в зеркало со сводкой изменений (или None)
+ReadyCallback = Callable[[Optional[dict]], None]
+
+
+@dataclass
+class MirrorTable:
+    """Разобранная версия справочника: строки, индексированные по ключу"""
+
+    oid: str
+    version: str
+    columns: Tuple[str, ...]
+    key_column: str
+    rows: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, code: str) -> Optional[Dict[str, str]]:
+        """Возвращает запись по значению ключа или None"""
+        row = self.rows.get(str(code))
+        if row is None:
+            return None
+        return dict(zip(self.columns, row))
+
+
+def _detect_key_column(columns: List[str]) -> str:
+    """Определяет колонку первичного ключа справочника"""
+    upper = {column.upper(): column for column in columns}
+    for candidate in _KEY_COLUMNS:
+        if candidate in upper:
+            return upper[candidate]
+    return columns[0]
+
+
+def parse_archive(oid: str, version: str, archive_path: Path) -> MirrorTable:
+    """
+    Разбирает CSV-архив справочника ФНСИ.
+
+    Args:
+        oid: OID справочника
+        version: версия справочника
+        archive_path: путь к {oid}_{version}_csv.zip
+
+    Returns:
+        MirrorTable с записями справочника
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        member = next(
+            (name for name in archive.namelist() if name.lower().endswith(".csv")),
+            None,
+        )
+        if member is None:
+            raise ValueError(f"В архиве {archive_path.name} нет CSV-файла")
+        with archive.open(member) as raw:
+            reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig"), delimiter=";")
+            columns = tuple(next(reader))
+            key_column = _detect_key_column(list(columns))
+            key_pos = columns.index(key_column)
+
+            rows: Dict[str, Tuple[str, ...]] = {}
+            duplicates = 0
+            for row in reader:
+                if not row:
+                    continue
+                key = row[key_pos]
+                if key in rows:
+                    duplicates += 1
+                rows[key] = tuple(row)
+
+    if duplicates:
+        logger.warning(
+            f"Справочник {oid} v{version}: {duplicates} повторяющихся значений ключа {key_column}"
+        )
+    return MirrorTable(oid, version, columns, key_column, rows)
+
+
+class NSIMirror:
+    """
+    Зеркало справочников НСИ в files_dir/mirror.
+
+    Для каждого справочника в зеркале хранится разобранная копия
+    {oid}_{version}.pkl. Архивы {oid}_{version}_csv.zip лежат в общем
+    каталоге files_dir: архив, уже скачанный другим модулем (например,
+    СЭМД 1520), повторно не скачивается. В общий реестр справочников
+    разобранная копия попадает только при обращении к ней (get/lookup).
+
+    Новые версии загружаются в фоновом потоке по одной (ensure), загрузка
+    одного справочника выполняется под его блокировкой.
+    """
+
+    def __init__(self, mirror_dir: Optional[Path] = None, archive_dir: Optional[Path] = None):
+        files_dir = get_config().paths.files_dir
+        self.mirror_dir = Path(mirror_dir or files_dir / "mirror")
+        self.mirror_dir.mkdir(parents=True, exist_ok=True)
+        self.archive_dir = Path(archive_dir or files_dir)
+        self._lock = Lock()
+        # OID -> версия, которая есть в зеркале
+        self._versions: Dict[str, str] = self._scan_versions()
+        # Блокировки загрузки по OID: один справочник не загружается
+        # в двух потоках одновременно
+        self._oid_locks: Dict[str, Lock] = {}
+        # Фоновая загрузка: очередь OID и запрошенная версия каждого из них
+        # с обработчиками готовности
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: Dict[str, Tuple[str, List[ReadyCallback]]] = {}
+        self._worker_thread: Optional[Thread] = None
+
+    def _scan_versions(self) -> Dict[str, str]:
+        """Находит версии справочников, уже сохранённые в зеркале"""
+        versions = {}
+        for path in self.mirror_dir.glob("*.pkl"):
+            oid, _, version = path.stem.partition("_")
+            if version:
+                versions[oid] = version
+        return versions
+
+    def _store_path(self, oid: str, version: str) -> Path:
+        return self.mirror_dir / f"{oid}_{version}.pkl"
+
+    def _archive_path(self, oid: str, version: str) -> Path:
+        return self.archive_dir / f"{oid}_{version}_csv.zip"
+
+    def get_version(self, oid: str) -> Optional[str]:
+        """Версия справочника в зеркале или None"""
+        with self._lock:
+            return self._versions.get(oid)
+
+    def _read_store(self, oid: str, version: str) -> Optional[MirrorTable]:
+        """Загружает разобранную копию справочника с диска"""
+        path = self._store_path(oid, version)
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать зеркало {path.name}: {e}")
+            return None
+
+    def get(self, oid: str) -> Optional[MirrorTable]:
+        """
+        Текущая версия справочника из зеркала.
+
+        Args:
+            oid: OID справочника
+
+        Returns:
+            MirrorTable или None, если справочника нет в зеркале
+        """
+        version = self.get_version(oid)
+        if version is None:
+            return None
+        return get_dictionary_registry().get_or_load(
+            _REGISTRY_PREFIX + oid, version, lambda: self._read_store(oid, version)
+        )
+
+    def lookup(self, oid: str, code: str) -> Optional[Dict[str, str]]:
+        """
+        Ищет запись справочника по коду (значению первичного ключа).
+
+        Returns:
+            Словарь {колонка: значение} или None
+        """
+        table = self.get(oid)
+        return table.get(code) if table is not None else None
+
+    def _oid_lock(self, oid: str) -> Lock:
+        with self._lock:
+            return self._oid_locks.setdefault(oid, Lock())
+
+    def refresh(self, oid: str, version: str) -> bool:
+        """
+        Загружает новую версию справочника в зеркало.
+
+        Скачивает архив (если его ещё нет в files_dir), разбирает его, сохраняет разобранную копию,
+        сравнивает её с предыдущей версией (результат сохраняется в базу)
+        и удаляет файлы предыдущих версий.
+
+        Args:
+            oid: OID справочника
+            version: новая версия справочника
+
+        Returns:
+            True, если эта версия есть в зеркале
+        """
+        with self._oid_lock(oid):
+            # Версию могли загрузить, пока мы ждали блокировку
+            if self.get_version(oid) == version:
+                return True
+            return self._refresh_locked(oid, version)
+
+    def _refresh_locked(self, oid: str, version: str) -> bool:
+        registry = get_dictionary_registry()
+        key = _REGISTRY_PREFIX + oid
+
+        # Предыдущая версия для сравнения: из реестра, если её уже используют,
+        # иначе с диска без регистрации в реестре
+        previous_version = self.get_version(oid)
+        previous = None
+        previous_registered = False
+        if previous_version is not None:
+            previous = registry.get(key, previous_version)
+            previous_registered = previous is not None
+            if previous is None:
+                previous = self._read_store(oid, previous_version)
+
+        deadline = time.monotonic() + _DOWNLOAD_TIMEOUT
+        if not download_file(oid, version, self.archive_dir, deadline):
+            logger.error(f"Не удалось скачать справочник {oid} v{version} в зеркало")
+            return False
+
+        try:
+            parsed = parse_archive(oid, version, self._archive_path(oid, version))
+            path = self._store_path(oid, version)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Ошибка разбора справочника {oid} v{version}: {e}")
+            return False
+
+        if previous is not None:
+            try:
+                diff = diff_tables(previous, parsed)
+                save_diff(diff)
+                summary = diff.summary()
+                logger.info(
+                    f"Справочник {oid} v{previous.version} → v{version}: "
+                    f"+{summary['added']} / -{summary['removed']} / ~{summary['changed']}"
+                )
+            except Exception as e:
+                logger.error(f"Ошибка сравнения версий справочника {oid}: {e}")
+
+        with self._lock:
+            self._versions[oid] = version
+        self._remove_stale_files(oid, version)
+
+        # Используемую версию сразу заменяем новой (реестр освободит старую),
+        # остальные справочники загрузятся в реестр при первом обращении
+        if previous_registered:
+            registry.get_or_load(key, version, lambda: parsed)
+        logger.info(
+            f"Справочник {oid} v{version} загружен в зеркало: {len(parsed)} записей"
+        )
+        return True
+
+    def _remove_stale_files(self, oid: str, version: str):
+        """Удаляет файлы других версий справочника"""
+        keep = {self._store_path(oid, version), self._archive_path(oid, version)}
+        stale = [
+            *self.mirror_dir.glob(f"{oid}_*"),
+            *self.archive_dir.glob(f"{oid}_*_csv.zip"),
+        ]
+        for path in stale:
+            if path not in keep:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"Не удалось удалить {path.name}: {e}")
+
+    def ensure(self, oid: str, version: str, on_ready: Optional[ReadyCallback] = None):
+        """
+        Ставит загрузку версии справочника в зеркало в фоновую очередь.
+
+        Справочники скачиваются по одному в отдельном потоке, не задерживая
+        проверку обновлений. Если справочник уже ждёт загрузки, загружается
+        последняя запрошенная версия.
+
+        Args:
+            oid: OID справочника
+            version: версия справочника
+            on_ready: вызывается после загрузки версии со сводкой изменений
+                относительно предыдущей (или None); если версия уже
+                в зеркале - сразу в вызывающем потоке
+        """
+        if self.get_version(oid) == version:
+            if on_ready is not None:
+                self._call_ready(oid, version, [on_ready])
+            return
+        with self._lock:
+            _, callbacks = self._pending.get(oid, (version, []))
+            if on_ready is not None:
+                callbacks.append(on_ready)
+            if oid not in self._pending:
+                self._queue.put(oid)
+            self._pending[oid] = (version, callbacks)
+            if self._worker_thread is None or not self._worker_thread.is_alive():
+                self._worker_thread = Thread(
+                    target=self._worker, name="nsi-mirror", daemon=True
+                )
+                self._worker_thread.start()
+
+    def _call_ready(self, oid: str, version: str, callbacks: List[ReadyCallback]):
+        summary = get_diff_summary(oid, version)
+        for callback in callbacks:
+            try:
+                callback(summary)
+            except Exception as e:
+                logger.error(f"Ошибка обработки загрузки справочника {oid} v{version}: {e}")
+
+    def _worker(self):
+        """Фоновая загрузка справочников из очереди"""
+        while True:
+            try:
+                oid = self._queue.get(timeout=5)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._worker_thread = None
+                        return
+                continue
+            with self._lock:
+                version, callbacks = self._pending.pop(oid)
+            try:
+                if self.refresh(oid, version):
+                    if callbacks:
+                        self._call_ready(oid, version, callbacks)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки справочника {oid} в зеркало: {e}")
+
+
+# Глобальный экземпляр зеркала
+_mirror: Optional[NSIMirror] = None
+_mirror_lock = Lock()
+
+
+def get_nsi_mirror() -> NSIMirror:
+    """Возвращает общий экземпляр зеркала справочников"""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = NSIMirror()
+        return _mirror
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)
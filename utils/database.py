@@ -1,26 +1,204 @@
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 from config import get_config
+from utils.migrations import FNSI_DB_MIGRATIONS, USER_DB_MIGRATIONS, Migration, apply_migrations
 cfg = get_config()
 # Настройка логирования
 import logging
 logger = logging.getLogger(__name__)
 
-def create_table_nsi_passport():
-    # Подключение к базе данных
-    con = sqlite3.connect(cfg.paths.fnsi_db_path)
-    cur = con.cursor()
-    try:
-        cur.execute("CREATE TABLE nsi_passport"\
-                    "(ID, Name, ShortName, lastUpdate, version, "\
-                    "releaseNotes, add_date);")
+# Размер кеша подготовленных запросов на соединение
+_CACHED_STATEMENTS = 256
+# Ожидание блокировки на запись дольше этого (сек) записывается в лог
+_SLOW_WAIT = 0.5
+# PRAGMA auto_vacuum: 2 - INCREMENTAL
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _enable_incremental_vacuum(con: sqlite3.Connection, db_name: str):
+    """
+    Переводит базу в auto_vacuum=INCREMENTAL.
+
+    Для существующей базы режим меняется только полным VACUUM, который
+    держит блокировку на запись всё время перестройки файла, поэтому
+    выполняется один раз при первом соединении, пока другие потоки
+    с базой ещё не работают.
+    """
+    if con.execute("PRAGMA auto_vacuum").fetchone()[0] == _AUTO_VACUUM_INCREMENTAL:
+        return
+    started = time.monotonic()
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    con.execute("VACUUM")
+    logger.info(f"{db_name}: включён auto_vacuum=INCREMENTAL (VACUUM {time.monotonic() - started:.1f} с)")
+
+
+class SQLiteConnectionManager:
+    """
+    Соединения с файлом базы SQLite: одно на поток, открывается при первом
+    обращении и переиспользуется.
+
+    Соединения работают в режиме WAL (читатели не блокируют писателя),
+    synchronous=NORMAL, с busy_timeout и mmap. Запись выполняется через
+    transaction(): BEGIN IMMEDIATE сразу берёт блокировку на запись,
+    время её ожидания учитывается в stats().
+
+    При первом соединении к схеме базы применяются миграции (utils.migrations)
+    и, если задано incremental_vacuum, база переводится в auto_vacuum=INCREMENTAL.
+    """
+
+    def __init__(self, path: Path, busy_timeout_ms: int, mmap_size: int,
+                 migrations: Optional[List[Migration]] = None,
+                 incremental_vacuum: bool = False):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.migrations = migrations or []
+        self.incremental_vacuum = incremental_vacuum
+        self.schema_version: Optional[int] = None
+        self._local = threading.local()
+        # Поток -> соединение, чтобы закрыть соединения завершившихся потоков
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._lock = threading.Lock()
+        self._transactions = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _open(self) -> sqlite3.Connection:
+        # isolation_level=None: транзакции открываются явно в transaction()
+        con = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=_CACHED_STATEMENTS,
+        )
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        con.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return con
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока"""
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            return con
+
+        con = self._open()
+        with self._lock:
+            if self.schema_version is None:
+                try:
+                    self.schema_version = apply_migrations(con, self.migrations, self.path.name)
+                    if self.incremental_vacuum:
+                        _enable_incremental_vacuum(con, self.path.name)
+                except Exception:
+                    con.close()
+                    raise
+            # Соединения завершившихся потоков больше никто не использует
+            for ident, (thread, old_con) in list(self._connections.items()):
+                if not thread.is_alive():
+                    old_con.close()
+                    del self._connections[ident]
+            self._connections[threading.get_ident()] = (threading.current_thread(), con)
+        self._local.con = con
+        return con
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Транзакция на запись: commit при выходе, rollback при исключении.
+
+        Вложенный вызов в том же потоке выполняется в рамках внешней транзакции.
+        """
+        con = self.connection()
+        if con.in_transaction:
+            yield con
+            return
+
+        started = time.monotonic()
+        con.execute("BEGIN IMMEDIATE")
+        wait = time.monotonic() - started
+        with self._lock:
+            self._transactions += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        if wait > _SLOW_WAIT:
+            logger.warning(f"{self.path.name}: ожидание блокировки на запись {wait:.2f} с")
+
+        try:
+            yield con
+        except BaseException:
+            con.rollback()
+            raise
         con.commit()
-        # Закрываем подключение к базе
-        con.close()
-    except Exception as e:
-        logger.warning(f'Warning: {e}')
-        # Закрываем подключение к базе
-        con.close()
+
+    def stats(self) -> dict:
+        """Число транзакций на запись и время ожидания блокировки (сек)"""
+        with self._lock:
+            return {
+                "connections": len(self._connections),
+                "transactions": self._transactions,
+                "wait_total": self._wait_total,
+                "wait_max": self._wait_max,
+                "wait_avg": self._wait_total / self._transactions if self._transactions else 0.0,
+            }
+
+    def close_all(self):
+        """Закрывает соединения всех потоков"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for _, con in connections:
+            try:
+                con.close()
+            except sqlite3.Error as e:
+                logger.warning(f'Warning: {e}')
+        self._local = threading.local()
+
+
+_managers: Dict[Path, SQLiteConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def _get_manager(path: Path, migrations: List[Migration],
+                 incremental_vacuum: bool = False) -> SQLiteConnectionManager:
+    with _managers_lock:
+        if path not in _managers:
+            _managers[path] = SQLiteConnectionManager(
+                path, cfg.database.busy_timeout_ms, cfg.database.mmap_size, migrations,
+                incremental_vacuum
+            )
+        return _managers[path]
+
+
+def get_user_db() -> SQLiteConnectionManager:
+    """Соединения с user_data.sqlite (журнал переносится в архив, место освобождается)"""
+    return _get_manager(cfg.paths.user_db_path, USER_DB_MIGRATIONS, incremental_vacuum=True)
+
+
+def get_fnsi_db() -> SQLiteConnectionManager:
+    """Соединения с fnsi_data.sqlite"""
+    return _get_manager(cfg.paths.fnsi_db_path, FNSI_DB_MIGRATIONS)
+
+
+def close_all_connections():
+    """Закрывает все соединения с базами и пишет в лог время ожидания блокировок"""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        stats = manager.stats()
+        logger.info(
+            f"{manager.path.name}: транзакций на запись {stats['transactions']}, "
+            f"ожидание блокировки ср. {stats['wait_avg'] * 1000:.1f} мс, "
+            f"макс. {stats['wait_max'] * 1000:.1f} мс"
+        )
+        manager.close_all()
+
 
 if __name__ == '__main__':
     logger.warning('This module is not for direct call')
-    exit(1)
\ No newline at end of file
+    exit(1)
@@ -1,40 +1,62 @@
 import glob
 import os
+from threading import Lock
+from time import monotonic
+from typing import Optional
 
 import requests
 
 # подключаем модули для dotenv
 from config import get_config
+from services.fnsi_http import get_fnsi_http
 from services.proxy_utils import build_proxies, build_url
 
 cfg = get_config()
 
+_DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.9; rv:45.0)"
+    " Gecko/20100101 Firefox/45.0"
+}
+# Размер куска при записи архива на диск
+_CHUNK_SIZE = 64 * 1024
+# Блокировки скачивания по имени архива: один архив качает один поток,
+# остальные ждут и используют скачанный файл
+_download_locks = {}
+_download_locks_guard = Lock()
+
 # Настройка логирования
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def download_file(nsi: str, ver: str, path: str = cfg.paths.files_dir) -> bool:
+def download_file(nsi: str, ver: str, path: str = cfg.paths.files_dir,
+                  deadline: Optional[float] = None) -> bool:
     """Эта функция удаляет все версии справочника в папке и скачивает
     необходимый архив со справочником в заданную папку.
+    Архив пишется во временный файл и появляется под своим именем только
+    целиком, поэтому уже скачанный архив не скачивается повторно.
 
     Args:
         nsi (str): OID справочника
         ver (str): версия справочника
+        deadline (float): крайний срок скачивания целиком (time.monotonic());
+            таймаут запроса ограничивает только ожидание каждого куска
 
     Returns:
         bool: True, если скачан успешно, False, если нет.
     """
     out_file_name = f"{nsi}_{ver}_csv.zip"
-    s = requests.Session()
-    s.headers.update(
-        {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.9; rv:45.0)"
-            " Gecko/20100101 Firefox/45.0"
-        }
-    )
-    if os.path.exists(os.path.join(path, out_file_name)):
+    with _download_locks_guard:
+        lock = _download_locks.setdefault(out_file_name, Lock())
+    with lock:
+        return _download(nsi, out_file_name, path, deadline)
+
+
+def _download(nsi: str, out_file_name: str, path: str, deadline: Optional[float]) -> bool:
+    out_path = os.path.join(path, out_file_name)
+    tmp_path = out_path + ".part"
+    if os.path.exists(out_path):
         return True
     try:
         # Удаляем предыдущие версии справочника
@@ -55,33 +77,38 @@ def download_file(nsi: str, ver: str, path: str = cfg.paths.files_dir) -> bool:
         # Получаем настройки прокси для данного URL
         proxies = build_proxies(download_url)
 
-        # Скачиваем файл
-        with open(os.path.join(path, out_file_name), "wb") as out_stream:
-            req = requests.get(
+        # Скачиваем файл через общую keep-alive сессию ФНСИ
+        session = get_fnsi_http().session()
+        with open(tmp_path, "wb") as out_stream:
+            with session.get(
                 download_url,
                 stream=True,
-                verify=str(cfg.paths.mzrf_cert_path),
+                headers=_DOWNLOAD_HEADERS,
+                timeout=cfg.apis.fnsi_request_timeout,
                 proxies=proxies,
-            )
-            if req.status_code != 200:
-                try:
-                    error_text = req.json().get("resultText", req.text)
-                except ValueError:
-                    error_text = req.text
-                raise FileNotFoundError(error_text)
-            # Скачиваем файл в папку
-            for chunk in req.iter_content(1024):  # Куски по 1 КБ
-                out_stream.write(chunk)
+            ) as req:
+                if req.status_code != 200:
+                    try:
+                        error_text = req.json().get("resultText", req.text)
+                    except ValueError:
+                        error_text = req.text
+                    raise FileNotFoundError(error_text)
+                # Скачиваем файл в папку
+                for chunk in req.iter_content(_CHUNK_SIZE):
+                    if deadline is not None and monotonic() > deadline:
+                        raise TimeoutError("истёк срок скачивания")
+                    out_stream.write(chunk)
+        os.replace(tmp_path, out_path)
         return True
     except requests.exceptions.RequestException as e:
         logger.error(f"Ошибка скачивания файла {out_file_name}: {e}")
-        if os.path.exists(os.path.join(path, out_file_name)):
-            os.remove(os.path.join(path, out_file_name))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
     except Exception as e:
         logger.error(f"Неожиданная ошибка при скачивании файла {out_file_name}: {e}")
-        if os.path.exists(os.path.join(path, out_file_name)):
-            os.remove(os.path.join(path, out_file_name))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
 
 
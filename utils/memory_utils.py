@@ -0,0 +1,69 @@
+"""Утилиты для измерения потребления памяти процессом"""
+import os
+from threading import Event, Thread
+
+# Настройка логирования
+import logging
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+
+def current_rss_mb() -> float:
+    """Текущий RSS процесса в МБ (0.0, если измерить не удалось)"""
+    try:
+        # Linux: второе поле statm - резидентные страницы
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, IndexError, AttributeError):
+        # AttributeError: os.sysconf нет в Windows
+        return 0.0
+
+
+class RSSSampler:
+    """
+    Замеряет RSS процесса в фоновом потоке, пока выполняется блок with.
+
+    В отличие от ru_maxrss (максимум за всё время работы процесса) peak -
+    наибольшее значение, замеченное внутри блока. Кратковременные всплески
+    короче интервала опроса могут быть не замечены.
+
+    Пример:
+        with RSSSampler() as rss:
+            ...
+        logger.info(f"RSS {rss.start:.0f} → {rss.end:.0f} МБ, пик {rss.peak:.0f} МБ")
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.start = self.end = self.peak = 0.0
+        self._stop = Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss > self.peak:
+            self.peak = rss
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RSSSampler":
+        self.start = self.peak = current_rss_mb()
+        self._thread = Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = self._sample()
+        return False
+
+
+if __name__ == '__main__':
+    logger.warning('This module is not for direct call')
+    exit(1)
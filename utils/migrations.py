@@ -0,0 +1,227 @@
+"""
+Версионные миграции схем баз SQLite.
+
+Номер применённой миграции хранится в PRAGMA user_version файла базы.
+Каждая миграция выполняется в своей транзакции вместе с увеличением
+user_version, поэтому прерванная миграция откатывается целиком и будет
+повторена при следующем запуске.
+
+Миграция 1 каждой базы описывает схему, которая была до появления
+миграций (CREATE ... IF NOT EXISTS), следующие изменяют её и переносят
+данные существующих баз.
+"""
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+def iso_to_epoch(value) -> Optional[int]:
+    """ISO-время (как писал datetime.now().isoformat()) в секунды Unix"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except ValueError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# user_data.sqlite
+# ---------------------------------------------------------------------------
+
+def _user_base_schema(con: sqlite3.Connection):
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS users ("
+        "id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, "
+        "last_name TEXT, reg_date TEXT)"
+    )
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS users_activity"
+        " (id INTEGER, activity TEXT, date_time TEXT)"
+    )
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS scheduler_state"
+        "(task_id TEXT PRIMARY KEY, schedule TEXT, "
+        "last_occurrence TEXT, last_started TEXT, last_status TEXT, "
+        "last_success TEXT, last_duration REAL, last_error TEXT, "
+        "next_run TEXT, runs INTEGER)"
+    )
+
+
+def _users_activity_epoch(con: sqlite3.Connection):
+    """date_time: ISO-текст -> секунды Unix (INTEGER) с индексом для выборки по периоду"""
+    con.create_function("iso_to_epoch", 1, iso_to_epoch, deterministic=True)
+    con.execute(
+        "CREATE TABLE users_activity_new ("
+        "id INTEGER NOT NULL, activity TEXT, date_time INTEGER)"
+    )
+    con.execute(
+        "INSERT INTO users_activity_new (id, activity, date_time) "
+        "SELECT id, activity, iso_to_epoch(date_time) FROM users_activity ORDER BY rowid"
+    )
+    invalid = con.execute(
+        "SELECT count(*) FROM users_activity_new WHERE date_time IS NULL"
+    ).fetchone()[0]
+    if invalid:
+        logger.warning(f"users_activity: {invalid} записей с нераспознанным временем")
+    con.execute("DROP TABLE users_activity")
+    con.execute("ALTER TABLE users_activity_new RENAME TO users_activity")
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_activity_date_time "
+        "ON users_activity(date_time)"
+    )
+
+
+def _activity_daily(con: sqlite3.Connection):
+    """
+    Сводка активности: число событий за день по активности и типу пользователя.
+
+    Заполняется по существующему журналу; тип пользователя (admin | user)
+    определяется по текущему ADMIN_ID.
+    """
+    admin_ids = get_config().accounts.admin_ids
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS activity_daily ("
+        "day TEXT NOT NULL, activity TEXT NOT NULL, user_kind TEXT NOT NULL, "
+        "events INTEGER NOT NULL, "
+        "PRIMARY KEY (day, activity, user_kind)) WITHOUT ROWID"
+    )
+    # Сводка - производные данные: строим заново по журналу
+    con.execute("DELETE FROM activity_daily")
+    con.execute(
+        "INSERT INTO activity_daily (day, activity, user_kind, events) "
+        "SELECT date(date_time, 'unixepoch', 'localtime'), coalesce(activity, ''), "
+        f"CASE WHEN id IN ({', '.join('?' * len(admin_ids))}) THEN 'admin' ELSE 'user' END, "
+        "count(*) FROM users_activity WHERE date_time IS NOT NULL GROUP BY 1, 2, 3",
+        admin_ids
+    )
+
+
+USER_DB_MIGRATIONS: List[Migration] = [
+    Migration(1, "base schema", _user_base_schema),
+    Migration(2, "users_activity: epoch date_time + index", _users_activity_epoch),
+    Migration(3, "activity_daily rollup", _activity_daily),
+]
+
+
+# ---------------------------------------------------------------------------
+# fnsi_data.sqlite
+# ---------------------------------------------------------------------------
+
+def _fnsi_base_schema(con: sqlite3.Connection):
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS nsi_passport"
+        "(ID, Name, ShortName, lastUpdate, version, releaseNotes, add_date)"
+    )
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS nsi_diff_summary"
+        "(ID TEXT, from_version TEXT, to_version TEXT, "
+        "added INTEGER, removed INTEGER, changed INTEGER, "
+        "add_date TEXT, UNIQUE(ID, to_version))"
+    )
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS nsi_diff_rows"
+        "(ID TEXT, to_version TEXT, change TEXT, row_key TEXT, "
+        "old_row TEXT, new_row TEXT)"
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_nsi_diff_rows_version "
+        "ON nsi_diff_rows(ID, to_version)"
+    )
+
+
+def _nsi_passport_keys(con: sqlite3.Connection):
+    """
+    nsi_passport: типы колонок, UNIQUE(ID, version) и индекс (ID, lastUpdate).
+
+    Даты остаются ISO-текстом: он сортируется по времени и так же
+    читается и выдаётся ФНСИ-клиентом. Повторы (ID, version) удаляются,
+    остаётся первая запись.
+    """
+    con.execute(
+        "CREATE TABLE nsi_passport_new ("
+        "ID TEXT NOT NULL, Name TEXT, ShortName TEXT, lastUpdate TEXT, "
+        "version TEXT NOT NULL, releaseNotes TEXT, add_date TEXT, "
+        "UNIQUE(ID, version))"
+    )
+    con.execute(
+        "INSERT OR IGNORE INTO nsi_passport_new "
+        "(ID, Name, ShortName, lastUpdate, version, releaseNotes, add_date) "
+        "SELECT ID, Name, ShortName, lastUpdate, version, releaseNotes, add_date "
+        "FROM nsi_passport WHERE ID IS NOT NULL AND version IS NOT NULL ORDER BY rowid"
+    )
+    before = con.execute("SELECT count(*) FROM nsi_passport").fetchone()[0]
+    after = con.execute("SELECT count(*) FROM nsi_passport_new").fetchone()[0]
+    if before != after:
+        logger.warning(f"nsi_passport: удалено {before - after} повторяющихся записей")
+    con.execute("DROP TABLE nsi_passport")
+    con.execute("ALTER TABLE nsi_passport_new RENAME TO nsi_passport")
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_nsi_passport_id_last_update "
+        "ON nsi_passport(ID, lastUpdate)"
+    )
+
+
+def _drop_nsi_diff_rows(con: sqlite3.Connection):
+    """
+    Удаляет nsi_diff_rows: строки изменений версий никто не читал,
+    а таблица только росла. Хранится лишь сводка nsi_diff_summary.
+    """
+    con.execute("DROP TABLE IF EXISTS nsi_diff_rows")
+
+
+FNSI_DB_MIGRATIONS: List[Migration] = [
+    Migration(1, "base schema", _fnsi_base_schema),
+    Migration(2, "nsi_passport: typed columns, UNIQUE(ID, version), (ID, lastUpdate) index", _nsi_passport_keys),
+    Migration(3, "drop nsi_diff_rows", _drop_nsi_diff_rows),
+]
+
+
+def apply_migrations(con: sqlite3.Connection, migrations: List[Migration], db_name: str) -> int:
+    """
+    Применяет миграции с номером больше PRAGMA user_version.
+
+    Соединение должно быть в режиме autocommit (isolation_level=None).
+
+    Returns:
+        int: версия схемы после применения
+    """
+    current = con.execute("PRAGMA user_version").fetchone()[0]
+    for migration in migrations:
+        if migration.version <= current:
+            continue
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            current = con.execute("PRAGMA user_version").fetchone()[0]
+            if migration.version <= current:
+                con.rollback()
+                continue
+            migration.apply(con)
+            con.execute(f"PRAGMA user_version = {int(migration.version)}")
+        except BaseException:
+            con.rollback()
+            logger.error(f"{db_name}: ошибка миграции {migration.version} ({migration.description})")
+            raise
+        con.commit()
+        current = migration.version
+        logger.info(f"{db_name}: применена миграция {migration.version} ({migration.description})")
+    return current
+
+
+if __name__ == "__main__":
+    logger.warning("This module is not for direct call")
+    exit(1)